@@ -1,6 +1,7 @@
 cfg = {
     'sim': {
-        'backend': 'local_qasm_simulator'
+        'backend': 'local_qasm_simulator',
+        'sample_counts': True
     },
     'qx': {
         'token': '',
@@ -1,10 +1,13 @@
 import numpy as np
+from functools import lru_cache
 
 # importing QISKit
-from qiskit import QuantumCircuit, ClassicalRegister, QuantumRegister, compile, execute, register, available_backends, get_backend
+from qiskit import QuantumCircuit, ClassicalRegister, QuantumRegister, QuantumJob, compile, register, available_backends, get_backend
 from qiskit.tools import visualization
 import Qconfig
 
+from quantum_dictionary.circuit_cache import CircuitCache
+
 
 def cry(theta, qc, q_control, q_target):
     qc.ry(theta/2, q_target)
@@ -17,7 +20,8 @@ def build_circuit(n):
     q = QuantumRegister(n)
     c = ClassicalRegister(n)
 
-    qc = QuantumCircuit(q, c)
+    # named by n, so that compiled qobjs can be shared by every circuit of the same n
+    qc = QuantumCircuit(q, c, name='fib%d' % n)
 
     for i in range(0, n):
         #qc.h(q[i])
@@ -29,36 +33,95 @@ def build_circuit(n):
     return qc, q, c
 
 
-def run(n, qc, cfg, backend = None):
-    if 'url' in cfg.keys():
+# accounts registered so far
+accounts = set()
+
+
+def run(n, qc, cfg, backend = None, shots = None, seed = None):
+    if 'url' in cfg.keys() and (cfg['url'], cfg['token']) not in accounts:
         register(cfg['token'], cfg['url'], cfg['hub'], cfg['group'], cfg['project'])
+        accounts.add((cfg['url'], cfg['token']))
         print(available_backends())
 
     if backend is None:
         backend = cfg['backend']
 
-    backend_config = get_backend(backend).configuration
-    backend_coupling = backend_config['coupling_map']
+    backend_coupling = backend_configuration(backend)['coupling_map']
 
-    qc_compiled = compile([qc], backend=backend, coupling_map=backend_coupling, seed=0)
-    qc_compiled_qasm = qc_compiled['circuits'][0]['compiled_circuit_qasm']
-    #print(qc_compiled_qasm)
+    qobj = compile_once(n, qc, backend, backend_coupling, seed)
+    #print(qobj['circuits'][0]['compiled_circuit_qasm'])
 
-    job = execute([qc], backend=backend, shots=int(np.power(2, n + 2)))
+    job = execute_compiled(qobj, backend, int(np.power(2, n + 2)) if shots is None else shots)
     result = job.result()
 
     return result
 
 
-def get_counts(n, cfg, backend = None):
+@lru_cache(maxsize=None)
+def backend_handle(backend):
+    return get_backend(backend)
+
+
+@lru_cache(maxsize=None)
+def backend_configuration(backend):
+    return backend_handle(backend).configuration
+
+
+# compiled qobjs by (n, measured, backend, coupling map, seed)
+compiled_circuits = CircuitCache(maxsize=16)
+
+
+def compile_once(n, qc, backend, coupling_map, seed = None):
+    # qc is build_circuit(n), measured or not, so n stands for it and its name. The qobj
+    # carries the simulator seed, None draws fresh shots on every run
+    measured = any(instruction.name == 'measure' for instruction in qc.data)
+    key = (n, measured, backend, repr(coupling_map), seed)
+    return compiled_circuits.get(key, lambda: compile([qc], backend=backend, coupling_map=coupling_map, seed=seed))
+
+
+def execute_compiled(qobj, backend, shots):
+    # what execute does after compiling
+    qobj = dict(qobj, config=dict(qobj['config'], shots=shots))
+    backend = backend_handle(backend)
+    job = QuantumJob(qobj, backend=backend, preformatted=True, resources={'max_credits': qobj['config']['max_credits']})
+    return backend.run(job)
+
+
+def get_counts(n, cfg, backend = None, shots = None, seed = None):
+    # with 'sample_counts' in the profile, shots are drawn from the simulated state instead of a qasm run
+    if backend is None and Qconfig.cfg[cfg].get('sample_counts', False):
+        sampler = get_sampler(n)
+        sampler.reseed(seed)
+        return sampler.counts(int(np.power(2, n + 2)) if shots is None else shots, [(i, i) for i in range(n)], n)
+
     qc, qr, cr = build_circuit(n)
     qc.measure(qr, cr)
-    result = run(n, qc, Qconfig.cfg[cfg], backend)
+    result = run(n, qc, Qconfig.cfg[cfg], backend, shots, seed)
     counts = result.get_counts()
     # visualization.plot_circuit(qc)
     return counts
 
 
+@lru_cache(maxsize=None)
+def get_sampler(n):
+    # the state of build_circuit(n), simulated once for every shot count
+    from quantum_dictionary.sampling import ShotSampler
+    from quantum_dictionary.statevector import simulate
+
+    qc, _, _ = build_circuit(n)
+    return ShotSampler(np.abs(simulate(qc).statevector)**2)
+
+
+def get_exact_count(n):
+    # F(n) as the number of nonzero amplitudes, from the structure of the ry / cry chain
+    from quantum_dictionary.chain_support import ChainSupportEngine
+    from quantum_dictionary.statevector import circuit_ops
+
+    qc, _, _ = build_circuit(n)
+    n_qubits, ops = circuit_ops(qc)
+    return ChainSupportEngine(n_qubits).run(ops).count()
+
+
 def histogram(state):
     n = len(state)
     pow = int(np.log2(n))
@@ -85,6 +148,10 @@ if __name__ == "__main__":
         print("F(", i, ") = ", len(hist))
         #visualization.plot_histogram(hist)
 
+    # exact, no shots and no 2^n amplitudes
+    for i in range(1, 41):
+        print("F(", i, ") = ", get_exact_count(i))
+
 # F( 1 ) =  2
     # F( 2 ) =  3
     # F( 3 ) =  5
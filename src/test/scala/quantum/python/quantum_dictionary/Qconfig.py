@@ -1,6 +1,19 @@
 cfg = {
     'sim': {
-        'backend': 'local_qasm_simulator'
+        'backend': 'local_qasm_simulator',
+        'statevector_backend': 'local_numpy_statevector_simulator',
+        'fuse_gates': True,
+        'snapshots': True,
+        'sample_counts': True
+    },
+    'fake': {
+        'token': 'fake',
+        'url': 'fake://remote',
+        'backend': 'fake_remote_backend',
+        'statevector_backend': 'fake_remote_backend',
+        'queue_latency': 0.5,
+        'max_experiments': 20,
+        'max_shots': 8192
     },
     'qx': {
         'token': '',
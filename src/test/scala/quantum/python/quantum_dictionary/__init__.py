@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules import each other as top level modules (from statevector import ...), which
+# also has to work when they are imported as quantum_dictionary.<module>, as fib.py does
+if os.path.dirname(__file__) not in sys.path:
+    sys.path.append(os.path.dirname(__file__))
@@ -0,0 +1,67 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from Qconfig import cfg as Qcfg
+
+from session import session
+
+
+# Submits many measured circuits as few jobs: circuits are packed up to the backend's
+# max_experiments per job, shots above max_shots are split over several jobs, at most
+# max_in_flight jobs wait on the backend at a time, and the counts are merged per circuit.
+# A profile 'seed' seeds the first job, the others get the seeds after it so that split shot
+# rounds do not repeat each other.
+#
+#   counts = await run_many(circuits, 'fake_remote_backend', 20000, 'fake')
+#   counts = asyncio.run(run_many(circuits, shots=20000, cfg='fake'))
+
+# used when neither the profile nor the backend configuration has a limit
+MAX_EXPERIMENTS = 20
+MAX_SHOTS = 8192
+
+
+def backend_limits(backend, cfg):
+    configuration = {} if backend in session.engines else session.configuration(backend)
+    return (cfg.get('max_experiments', configuration.get('max_experiments', MAX_EXPERIMENTS)),
+            cfg.get('max_shots', configuration.get('max_shots', MAX_SHOTS)))
+
+
+def job_plan(n_circuits, shots, max_experiments, max_shots):
+    # (circuit indices, shots) of every job
+    rounds = [min(max_shots, shots - s) for s in range(0, shots, max_shots)]
+    chunks = [list(range(i, min(i + max_experiments, n_circuits))) for i in range(0, n_circuits, max_experiments)]
+    return [(chunk, r) for r in rounds for chunk in chunks]
+
+
+def job_profile(cfg, j):
+    # the profile of the j-th job
+    if cfg.get('seed') is None:
+        return cfg
+    return dict(cfg, seed=cfg['seed'] + j)
+
+
+async def run_many(circuits, backend = None, shots = 1024, cfg = 'sim', max_in_flight = 4):
+    cfg = Qcfg[cfg] if isinstance(cfg, str) else cfg
+    if backend is None:
+        backend = cfg['backend']
+
+    max_experiments, max_shots = backend_limits(backend, cfg)
+    plan = job_plan(len(circuits), shots, max_experiments, max_shots)
+
+    loop = asyncio.get_running_loop()
+    in_flight = asyncio.Semaphore(max_in_flight)
+    merged = [Counter() for _ in circuits]
+
+    with ThreadPoolExecutor(max_in_flight) as pool:
+        async def submit(indices, job_shots, job_cfg):
+            async with in_flight:
+                counts = await loop.run_in_executor(pool, session.run_counts, job_shots,
+                                                    [circuits[i] for i in indices], job_cfg, backend)
+            for i, c in zip(indices, counts):
+                merged[i].update(c)
+
+        await asyncio.gather(*(submit(indices, job_shots, job_profile(cfg, j))
+                               for j, (indices, job_shots) in enumerate(plan)))
+
+    return [dict(c) for c in merged]
@@ -0,0 +1,139 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+
+# Runs dictionary jobs from a JSONL file on a process pool and streams one JSONL result per job
+#
+# A job is a JSON object like
+#   {"id": "qubo-3", "type": "qubo", "key_bits": 3, "value_bits": 6, "precision_bits": 6,
+#    "f": {"0": 12, "1": 1, "2": -15, "0,1": 3, "1,2": -9}, "query": "value_for_key", "key": 3, "neg": true}
+# QUBO coefficients are keyed by "i", "i,j" or "i,j,k,.." (order_terms is optional); the other
+# types take a list for f. "auto" takes a list and encodes it as a QUBO when that takes fewer gates.
+#
+# queries: value_for_key (key), values_for_keys (keys), value_distribution, zero_count,
+# negative_value_count, count_for_value (value); neg, exact and qft_degree are optional, and
+# value_bits defaults to the smallest register that holds every value.
+
+TYPES = {
+    'function': ('function_dictionary', 'QFunctionDictionary'),
+    'qubo': ('qubo_dictionary', 'QQUBODictionary'),
+    'fibo': ('fibo_dictionary', 'QFiboDictionary'),
+    'sum': ('sum_dictionary', 'QSumDictionary'),
+    'partition': ('partition_dictionary', 'QPartitionDictionary'),
+    'value_search': ('quantum_dictionary_value_search', 'QValueSearchDictionary'),
+    # a function table, encoded as a polynomial when that takes fewer gates
+    'auto': ('polynomial', 'compile_function_dictionary')
+}
+
+# constructors without precision_bits
+NO_PRECISION = ('sum', 'value_search')
+
+
+def warm():
+    # per worker: import qiskit, numpy and the dictionaries once, keep stdout for the results
+    sys.stdout = sys.stderr
+    for module, name in TYPES.values():
+        # the dictionary classes; compile_function_dictionary builds one of them
+        cls = getattr(importlib.import_module(module), name)
+        if isinstance(cls, type):
+            cls.verbose = False
+
+
+def coefficients(job):
+    f = job.get('f')
+    if job['type'] == 'qubo':
+        return {tuple(int(i) for i in k.split(',')) if ',' in k else int(k): v for k, v in f.items()}
+    return f
+
+
+def build(job):
+    module, name = TYPES[job['type']]
+    cls = getattr(importlib.import_module(module), name)
+    options = {'qft_degree': job.get('qft_degree')}
+    if 'order_terms' in job:
+        options['order_terms'] = job['order_terms']
+    if job['type'] in NO_PRECISION:
+        return cls(job['key_bits'], job.get('value_bits'), coefficients(job), **options)
+    return cls(job['key_bits'], job.get('value_bits'), job.get('precision_bits', 0), coefficients(job), **options)
+
+
+def rows(outcomes):
+    return [{name: outcome[name].item() for name in outcomes.dtype.names} for outcome in np.atleast_1d(outcomes)]
+
+
+def query(qd, job):
+    q = job.get('query', 'value_for_key')
+    neg = job.get('neg', False)
+    exact = job.get('exact', False)
+
+    if q == 'value_for_key':
+        return rows(qd.get_value_for_key(job['key'], neg).most_likely())[0]
+    if q == 'values_for_keys':
+        return rows(qd.get_values_for_keys(job['keys'], neg))
+    if q == 'value_distribution':
+        return {str(v): p for v, p in qd.get_value_distribution(neg).value_frequencies().items()}
+    if q == 'zero_count':
+        return qd.get_zero_count(exact)
+    if q == 'negative_value_count':
+        return qd.get_negative_value_count(exact)
+    if q == 'count_for_value':
+        return qd.get_count_for_value(job['value'], exact)
+    raise ValueError("unknown query: " + q)
+
+
+def run_job(job):
+    start = time.time()
+    try:
+        value = query(build(job), job)
+        record = {'id': job.get('id'), 'result': value}
+    except Exception as e:
+        record = {'id': job.get('id'), 'error': repr(e), 'traceback': traceback.format_exc()}
+    record['seconds'] = time.time() - start
+    record['pid'] = os.getpid()
+    return record
+
+
+def to_json(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(repr(o) + " is not JSON serializable")
+
+
+def read_jobs(path):
+    with open(path) as f:
+        for i, line in enumerate(f):
+            if line.strip():
+                job = json.loads(line)
+                job.setdefault('id', i)
+                yield job
+
+
+def run_batch(jobs, out, workers = None):
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm) as pool:
+        futures = [pool.submit(run_job, job) for job in jobs]
+        for future in as_completed(futures):
+            out.write(json.dumps(future.result(), default=to_json) + "\n")
+            out.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run quantum dictionary jobs from a JSONL file")
+    parser.add_argument('jobs', help="JSONL job specs")
+    parser.add_argument('-o', '--out', help="JSONL results, stdout if omitted")
+    parser.add_argument('-j', '--workers', type=int, help="worker processes, one per CPU if omitted")
+    args = parser.parse_args()
+
+    out = open(args.out, 'w') if args.out else sys.stdout
+    try:
+        run_batch(read_jobs(args.jobs), out, args.workers)
+    finally:
+        if args.out:
+            out.close()
@@ -0,0 +1,150 @@
+import argparse
+import itertools
+import json
+import platform
+import resource
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+
+# Sweeps dictionary sizes and records, per circuit: build time, gates, depth, qubits,
+# simulation time, post-processing time and peak RSS, one JSON object per line
+#
+# Every case runs in a fresh worker process, so the peak RSS is the case's own.
+# python benchmark.py -o new.jsonl --compare old.jsonl prints the ratios against an earlier run.
+
+TYPES = ['function', 'qubo', 'fibo', 'sum', 'partition', 'value_search']
+
+# types that have a counting circuit
+COUNTING = ['function', 'qubo', 'fibo', 'partition']
+
+
+def coefficients(dictionary_type, key_bits, value_bits, seed = 0):
+    rng = np.random.RandomState(seed)
+    if dictionary_type in ('function', 'value_search'):
+        return [int(v) for v in rng.randint(0, 2**(value_bits - 1), 2**key_bits)]
+    if dictionary_type == 'qubo':
+        d = {str(i): int(rng.randint(-4, 5)) for i in range(key_bits)}
+        d.update({'%d,%d' % (i, i + 1): int(rng.randint(-4, 5)) for i in range(key_bits - 1)})
+        return d
+    if dictionary_type in ('sum', 'partition'):
+        return [int(v) for v in rng.randint(1, 2**(value_bits - 2) + 1, key_bits)]
+    return None
+
+
+def cases(types, key_bits, value_bits, precision_bits):
+    for t, n, m, p in itertools.product(types, key_bits, value_bits, precision_bits):
+        if p > 0 and t not in COUNTING:
+            continue
+        yield {'case': '%s/k%d/v%d/p%d' % (t, n, m, p), 'type': t, 'key_bits': n, 'value_bits': m,
+               'precision_bits': p, 'circuit': 'count' if p > 0 else 'lookup',
+               'f': coefficients(t, n, m)}
+
+
+def build_circuit(qd, case):
+    from circuit_util import oracle0
+
+    if case['circuit'] == 'count':
+        return qd.get_count_circuit(oracle0)
+    return qd.get_circuit()
+
+
+def post_process(circuit, result, case):
+    from result import DictionaryResult
+    from util import distribution, register_qubits
+
+    state = result.get_data(circuit)['statevector']
+    if case['circuit'] == 'count':
+        return distribution(state, register_qubits(circuit, ['precision']))
+    indices, probs = distribution(state, register_qubits(circuit, ['key', 'value']))
+    return DictionaryResult(case['key_bits'], case['value_bits'], indices, probs).value_distribution()
+
+
+def run_case(case):
+    from Qconfig import cfg as Qcfg
+    from batch import build
+    from circuit_cache import circuit_cache
+    from resources import circuit_resources
+    from util import run, statevector_backend
+
+    record = {k: v for k, v in case.items() if k != 'f'}
+    try:
+        qd = build(case)
+        circuit_cache.clear()
+
+        start = time.perf_counter()
+        circuit = build_circuit(qd, case)
+        record['build_seconds'] = time.perf_counter() - start
+
+        resources = circuit_resources(circuit)
+        for k in ('qubits', 'gates', 'depth', 'two_qubit_gates'):
+            record[k] = resources[k]
+
+        start = time.perf_counter()
+        result = run(1, circuit, Qcfg['sim'], statevector_backend('sim'))
+        record['simulate_seconds'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        post_process(circuit, result, case)
+        record['post_process_seconds'] = time.perf_counter() - start
+    except Exception as e:
+        record['error'] = repr(e)
+
+    # kilobytes on linux
+    record['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return record
+
+
+def quiet():
+    sys.stdout = sys.stderr
+
+
+def environment():
+    from Qconfig import cfg as Qcfg
+    from util import statevector_backend
+
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'backend': statevector_backend('sim'), 'fuse_gates': Qcfg['sim'].get('fuse_gates', False)}
+
+
+def compare(records, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {r['case']: r for r in map(json.loads, f) if 'case' in r}
+
+    keys = ('build_seconds', 'simulate_seconds', 'post_process_seconds', 'gates', 'depth', 'peak_rss_mb')
+    for r in records:
+        old = baseline.get(r['case'])
+        if old is None or 'error' in r or 'error' in old:
+            continue
+        ratios = ['%s %.2fx' % (k, r[k] / old[k]) for k in keys if old.get(k)]
+        print(r['case'], ', '.join(ratios))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark quantum dictionary circuits")
+    parser.add_argument('-o', '--out', default='benchmark.jsonl')
+    parser.add_argument('-t', '--types', nargs='+', default=TYPES, choices=TYPES)
+    parser.add_argument('-k', '--key-bits', nargs='+', type=int, default=[2, 3, 4])
+    parser.add_argument('-v', '--value-bits', nargs='+', type=int, default=[3, 4])
+    parser.add_argument('-p', '--precision-bits', nargs='+', type=int, default=[0, 3])
+    parser.add_argument('-j', '--workers', type=int, default=1, help="parallel cases, timings are cleanest with 1")
+    parser.add_argument('--compare', help="an earlier output file")
+    args = parser.parse_args()
+
+    env = environment()
+    records = []
+    with open(args.out, 'w') as out:
+        with Pool(args.workers, initializer=quiet, maxtasksperchild=1) as pool:
+            for record in pool.imap(run_case, cases(args.types, args.key_bits, args.value_bits, args.precision_bits)):
+                record.update(env)
+                records.append(record)
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                print(record['case'], record['error'] if 'error' in record else
+                      '%.3fs' % (record['build_seconds'] + record['simulate_seconds']))
+
+    if args.compare:
+        compare(records, args.compare)
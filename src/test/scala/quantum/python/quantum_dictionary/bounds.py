@@ -0,0 +1,60 @@
+import math
+
+import numpy as np
+
+
+# Value ranges of the encoded functions, for sizing value registers. Values are encoded modulo
+# 2^value_bits, so a register narrower than twos_complement_bits(low, high) silently wraps.
+
+# largest key for which polynomial_range evaluates every key, 2^22 values
+EXACT_KEY_BITS = 22
+
+
+def twos_complement_bits(low, high):
+    # smallest m with -2^(m-1) <= low and high <= 2^(m-1) - 1
+    low, high = math.floor(low), math.ceil(high)
+    m = 1
+    while low < -2**(m - 1) or high > 2**(m - 1) - 1:
+        m += 1
+    return m
+
+
+def table_range(f, key_bits):
+    values = [f[k] for k in range(2**key_bits)]
+    return min(values), max(values)
+
+
+def subset_sum_range(f):
+    # range of the sum of any subset of f, as QSumDictionary and QPartitionDictionary encode
+    return sum(min(0, v) for v in f), sum(max(0, v) for v in f)
+
+
+def zeta(c, inverse = False):
+    # f[k] = sum of c[s] over the subsets s of k, O(n 2^n); inverse: the Mobius transform, the
+    # coefficients c[s] of f(x) = sum_s c[s] prod_{bit i of s} x_i
+    f = np.array(c, dtype=float)
+    h = 1
+    while h < len(f):
+        f = f.reshape(-1, 2, h)
+        if inverse:
+            f[:, 1] -= f[:, 0]
+        else:
+            f[:, 1] += f[:, 0]
+        f = f.reshape(-1)
+        h *= 2
+    return f
+
+
+def polynomial_range(terms, key_bits):
+    # terms: (key positions, coefficient) pairs, key[0] the most significant bit of a key.
+    # Exact up to EXACT_KEY_BITS by evaluating every key, beyond that the (sound but possibly
+    # loose) sum of the negative and of the positive coefficients
+    if key_bits > EXACT_KEY_BITS:
+        return sum(min(0, v) for _, v in terms), sum(max(0, v) for _, v in terms)
+
+    c = np.zeros(2**key_bits)
+    for term, v in terms:
+        c[sum(1 << (key_bits - 1 - j) for j in set(term))] += v
+    f = zeta(c)
+    low, high = f.min().item(), f.max().item()
+    return (int(round(low)), int(round(high))) if all(v == int(v) for _, v in terms) else (low, high)
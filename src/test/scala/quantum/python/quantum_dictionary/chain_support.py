@@ -0,0 +1,122 @@
+import numpy as np
+
+from fusion import X, Z
+from statevector import H, rx_matrix, ry_matrix
+
+
+# single qubit gates by name, from their params
+GATES = {
+    'h': lambda p: H,
+    'x': lambda p: X,
+    'z': lambda p: Z,
+    'u1': lambda p: np.diag([1, np.exp(1j * p[0])]),
+    'rx': lambda p: rx_matrix(p[0]),
+    'ry': lambda p: ry_matrix(p[0])
+}
+
+# controlled gates by name, as the gate applied to the target when the control is 1
+CONTROLLED = {
+    'cx': lambda p: GATES['x'](p),
+    'cz': lambda p: GATES['z'](p),
+    'cu1': lambda p: GATES['u1'](p),
+    'mcry': lambda p: GATES['ry'](p)
+}
+
+
+class ChainSupportEngine():
+    # Exact support of states built from single qubit gates and singly controlled gates
+    # where every qubit has at most one control and a control is final once it is used,
+    # like the ry + nearest neighbour cry chains of fib.py
+    #
+    # Such a state factorizes as amp(b) = prod_q state[q][b[parent[q]]][b[q]], so the number of
+    # nonzero amplitudes is a product over the control forest, computed without 2^n amplitudes.
+
+    def __init__(self, n_qubits, tolerance = 1e-12):
+        self.n_qubits = n_qubits
+        self.tolerance = tolerance
+        self.parent = [None] * n_qubits
+        # state[q][c]: state of qubit q when its control is c, both the same without a control
+        self.state = [[np.array([1, 0], dtype=np.complex128)] * 2 for _ in range(n_qubits)]
+        self.final = [False] * n_qubits
+
+    def apply(self, name, params, qubits):
+        if name in ('checkpoint', 'barrier', 'measure'):
+            return
+        if name in GATES and len(qubits) == 1:
+            self.apply_matrix(GATES[name](params), qubits[0])
+        elif name in CONTROLLED and len(qubits) == 2:
+            self.apply_controlled(CONTROLLED[name](params), qubits[0], qubits[1])
+        else:
+            raise ValueError("unsupported gate for the chain support engine: " + name)
+
+    def apply_matrix(self, u, target):
+        if self.final[target]:
+            raise ValueError("qubit %d changes after it controlled another qubit" % target)
+        self.state[target] = [u.dot(v) for v in self.state[target]]
+
+    def apply_controlled(self, u, control, target):
+        if self.parent[target] not in (None, control):
+            raise ValueError("qubit %d has more than one control" % target)
+        if self.final[target] or self.parent[control] == target:
+            raise ValueError("qubit %d changes after it controlled another qubit" % target)
+        self.parent[target] = control
+        self.final[control] = True
+        self.state[target] = [self.state[target][0], u.dot(self.state[target][1])]
+
+    def run(self, ops):
+        for name, params, qubits in ops:
+            self.apply(name, params, qubits)
+        return self
+
+    def nonzero(self, q, c):
+        return [b for b in (0, 1) if abs(self.state[q][c][b]) > self.tolerance]
+
+    def __children(self):
+        children = [[] for _ in range(self.n_qubits)]
+        for q, p in enumerate(self.parent):
+            if p is not None:
+                children[p].append(q)
+        return children
+
+    def __top_down(self, children):
+        # every qubit after its control
+        order = []
+        stack = [q for q in range(self.n_qubits) if self.parent[q] is None]
+        while stack:
+            q = stack.pop()
+            order.append(q)
+            stack.extend(children[q])
+        return order
+
+    def count(self):
+        # number of nonzero amplitudes, an exact python int
+        children = self.__children()
+
+        # subtree[q][b]: nonzero assignments of the qubits below q when q is b
+        subtree = [None] * self.n_qubits
+        for q in reversed(self.__top_down(children)):
+            subtree[q] = [1, 1]
+            for b in (0, 1):
+                for child in children[q]:
+                    subtree[q][b] *= sum(subtree[child][t] for t in self.nonzero(child, b))
+
+        total = 1
+        for q in range(self.n_qubits):
+            if self.parent[q] is None:
+                total *= sum(subtree[q][b] for b in self.nonzero(q, 0))
+        return total
+
+    def support(self):
+        # nonzero basis states as integers (qubit q is bit q) with their amplitudes, lazily
+        order = self.__top_down(self.__children())
+
+        def extend(i, index, amplitude):
+            if i == len(order):
+                yield index, amplitude
+                return
+            q = order[i]
+            c = 0 if self.parent[q] is None else (index >> self.parent[q]) & 1
+            for b in self.nonzero(q, c):
+                yield from extend(i + 1, index | (b << q), amplitude * self.state[q][c][b])
+
+        return extend(0, 0, 1)
@@ -0,0 +1,47 @@
+import hashlib
+from collections import OrderedDict
+
+
+def content_hash(f):
+    # hash of a dictionary's function table / coefficients, so that mutating f changes the key
+    if f is None:
+        return None
+    if isinstance(f, dict):
+        items = sorted(f.items(), key=lambda item: repr(item[0]))
+    else:
+        items = list(f)
+    return hashlib.sha1(repr(items).encode()).hexdigest()
+
+
+class CircuitCache():
+    # A size bounded LRU cache of built circuits
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.circuits = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        if key in self.circuits:
+            self.hits += 1
+            self.circuits.move_to_end(key)
+            return self.circuits[key]
+
+        self.misses += 1
+        circuit = build()
+        if self.maxsize > 0:
+            self.circuits[key] = circuit
+            while len(self.circuits) > self.maxsize:
+                self.circuits.popitem(last=False)
+        return circuit
+
+    def invalidate(self, prefix):
+        for key in [k for k in self.circuits if k[:len(prefix)] == prefix]:
+            del self.circuits[key]
+
+    def clear(self):
+        self.circuits.clear()
+
+
+circuit_cache = CircuitCache()
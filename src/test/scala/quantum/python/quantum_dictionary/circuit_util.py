@@ -1,4 +1,57 @@
 import numpy as np
+from functools import lru_cache
+
+from engine_gates import mcx, mcz, mcry, qft_block
+
+
+# when set, n-controlled gates are emitted as single multi-controlled ops that only the in-repo
+# engines apply, and circuits need no ancillas for Toffoli ladders
+NATIVE_CONTROLLED = False
+
+
+def use_native_controlled(enabled = True):
+    global NATIVE_CONTROLLED
+    NATIVE_CONTROLLED = enabled
+
+
+def native_controlled():
+    return NATIVE_CONTROLLED
+
+
+# when set, exact qft/iqft blocks are emitted as single ops that the in-repo engines apply with numpy.fft
+NATIVE_QFT = False
+
+
+def use_native_qft(enabled = True):
+    global NATIVE_QFT
+    NATIVE_QFT = enabled
+
+
+def native_qft():
+    return NATIVE_QFT
+
+
+def as_qubit(t):
+    # targets are passed both as qubits and as one-qubit registers
+    return t if isinstance(t, tuple) else t[0]
+
+
+class MultiControlled():
+    # Stands in for the circuit inside a c_gate: gates on the control qubit become
+    # multi-controlled ops on all of ctrl, the others pass through to the circuit
+
+    def __init__(self, qc, ctrl):
+        self.qc = qc
+        self.ctrl = [ctrl[i] for i in range(len(ctrl))]
+
+    def cx(self, _, t):
+        mcx(self.qc, self.ctrl, as_qubit(t))
+
+    def cz(self, _, t):
+        mcz(self.qc, self.ctrl, as_qubit(t))
+
+    def ry(self, theta, t):
+        self.qc.ry(theta, t)
 
 
 def controlled_X(qc, ctrl, anc, tgt):
@@ -16,6 +69,10 @@ def controlled(qc, ctrl, anc, tgt, c_gate = lambda qc, c, t: qc.cx(c, t), cc_gat
         c_gate(qc, ctrl[0], tgt[0])
         return
 
+    if NATIVE_CONTROLLED:
+        c_gate(MultiControlled(qc, ctrl), None, tgt[0])
+        return
+
     # compute
     cc_gate(qc, ctrl[0], ctrl[1], anc[0])
     for i in range(2, n):
@@ -54,8 +111,52 @@ def cry(theta, qc, q_control, q_target):
 
 
 def controlled_ry(qc, theta, ctrl, anc, tgt):
+    if NATIVE_CONTROLLED and len(ctrl) > 1:
+        return mcry(qc, theta, [ctrl[i] for i in range(len(ctrl))], as_qubit(tgt[0]))
     return controlled(qc, ctrl, anc, tgt, c_gate = lambda qc, c, t: cry(theta, qc, c, t))
 
+def walsh_hadamard(a):
+    # W[s] = sum_k a[k] (-1)^popcount(s & k), O(N log N)
+    a = np.array(a, dtype=float)
+    h = 1
+    while h < len(a):
+        a = a.reshape(-1, 2, h)
+        a = np.stack([a[:, 0] + a[:, 1], a[:, 0] - a[:, 1]], axis=1).reshape(-1)
+        h *= 2
+    return a
+
+
+def uniformly_controlled_ry(qc, weights, ctrl, tgt):
+    # Ry(alpha_k) on tgt for every basis state k of ctrl (ctrl[0] most significant), given the
+    # Walsh coefficients weights = walsh_hadamard(alpha) / 2^n: one ry per coefficient in Gray code
+    # order, each followed by the cx that flips the sign of the next ones, so 2^n ry + 2^n cx
+    n = len(ctrl)
+    for j in range(2**n):
+        gray = j ^ (j >> 1)
+        if not np.isclose(weights[gray], 0):
+            qc.ry(weights[gray], tgt)
+        if n > 0:
+            # the bit that changes to the next code, the top one to close the cycle
+            bit = n - 1 if j == 2**n - 1 else ((j + 1) & -(j + 1)).bit_length() - 1
+            qc.cx(ctrl[n - 1 - bit], tgt)
+
+
+def function_rotations(qc, f, key, value, tgt):
+    # Ry(4 pi f(k) v / 2^m) on tgt for key k and value v (value[0] least significant), what
+    # on_match_ry applies key by key and value bit by value bit, with uniformly controlled rotations.
+    # Since v_i theta = theta / 2 - (-1)^v_i theta / 2 and cx(v_i, tgt) flips the sign of the rotations
+    # it encloses, it takes m + 1 of them, all from a single Walsh-Hadamard transform of f
+    m = len(value)
+    weights = walsh_hadamard([f[k] for k in range(2**len(key))]) / 2**len(key)
+    c = [4 * np.pi * 2**i / 2**m for i in range(m)]
+
+    uniformly_controlled_ry(qc, weights * sum(c) / 2, key, tgt)
+    for i in range(m):
+        qc.cx(value[i], tgt)
+        uniformly_controlled_ry(qc, -weights * c[i] / 2, key, tgt)
+        qc.cx(value[i], tgt)
+
+
 def cx(qc, q_control, q_target):
     qc.cx(q_control, q_target)
 
@@ -109,6 +210,8 @@ def grover(m, qc, q, e, a):
     # qc.x(a[0])
 
 
+# memoized so that the oracle for a value keeps its identity, which circuit caching relies on
+@lru_cache(maxsize=None)
 def get_oracle(m):
     def oracle(qc, c, q, e, a):
         n = len(q)
@@ -129,22 +232,66 @@ def oracle_first_bit_one(qc, c, q, e, a):
     controlled(qc, [c[i] for i in range(len(c))] + [q[0]], e, a, c_gate = czxzx)
 
 
-def qft(qc, q):
+def qft(qc, q, degree = None):
+    # degree: the largest distance between qubits whose controlled rotation is kept,
+    # None for the exact transform; the approximate one has O(n * degree) gates
+    if NATIVE_QFT and (degree is None or degree >= len(q) - 1):
+        return qft_block(qc, [q[j] for j in range(len(q))])
     for j in range(len(q)):
         qc.h(q[j])
         for k in range(j + 1, len(q)):
-            qc.cu1(np.pi/float(2**(k - j)), q[k], q[j])
+            if degree is None or k - j <= degree:
+                qc.cu1(np.pi/float(2**(k - j)), q[k], q[j])
             # crz(-np.pi/float(2**(j-k)), qc, q[j], q[k])
 
 
-def iqft(qc, q):
+def iqft(qc, q, degree = None):
+    if NATIVE_QFT and (degree is None or degree >= len(q) - 1):
+        return qft_block(qc, [q[j] for j in range(len(q))], inverse=True)
     for j in range(len(q))[::-1]:
         qc.h(q[j])
         for k in range(j)[::-1]:
-            qc.cu1(-np.pi/float(2**(j-k)), q[j], q[k])
+            if degree is None or j - k <= degree:
+                qc.cu1(-np.pi/float(2**(j-k)), q[j], q[k])
             # crz(-np.pi/float(2**(j-k)), qc, q[j], q[k])
 
 
+def qft_rotations(n, degree = None):
+    # controlled rotations of a qft on n qubits, n - d of them at distance d
+    return sum(n - d for d in range(1, n if degree is None else min(n, degree + 1)))
+
+
+def qft_error_bound(n, degree = None):
+    # operator norm bound on the difference to the exact qft: every dropped rotation
+    # by pi/2^d is off by |1 - e^(i pi/2^d)| = 2 sin(pi/2^(d+1))
+    if degree is None:
+        return 0.0
+    return sum((n - d) * 2 * np.sin(np.pi / 2**(d + 1)) for d in range(degree + 1, n))
+
+
+def qft_degree(n, error):
+    # smallest degree whose bound is within error, for an n qubit value register
+    for degree in range(n):
+        if qft_error_bound(n, degree) <= error:
+            return degree
+    return None
+
+
+def qft_error_report(n, degrees = None, applications = 1):
+    # kept and dropped rotations and the error bound per degree; applications is how many
+    # qft/iqft a circuit applies (2 per prepare + unprepare), since the bounds add up
+    rows = []
+    for degree in (range(1, n) if degrees is None else degrees):
+        kept = qft_rotations(n, degree)
+        rows.append((degree, kept, qft_rotations(n) - kept, applications * qft_error_bound(n, degree)))
+
+    print("qft on %d qubits, %d applications" % (n, applications))
+    print("%8s %8s %8s %12s" % ("degree", "kept", "dropped", "error bound"))
+    for row in rows:
+        print("%8d %8d %8d %12.3e" % row)
+    return rows
+
+
 def oracle0(qc, c, q, e, a):
     for i in range(0, len(q)):
         qc.x(q[i])
@@ -0,0 +1,60 @@
+from qiskit import Gate
+
+# Gates that only the in-repo engines (statevector, sparse_state) know how to apply. They let
+# circuit construction hand a whole block to the simulator as one op.
+
+
+class FunctionEncodingGate(Gate):
+    # Ry(4 pi f(k) v / 2^m) on the target for key k and value v: the rotations of a
+    # QFunctionDictionary prepare stage before its inverse QFT
+
+    def __init__(self, f, key, value, target, circ=None):
+        super().__init__("encode_function", [f[k] for k in range(2**len(key))], key + value + [target], circ)
+
+
+def encode_function(qc, f, key, value, target):
+    return qc._attach(FunctionEncodingGate(f, key, value, target, qc))
+
+
+class CheckpointGate(Gate):
+    # Marks the end of a circuit prefix that other circuits share; the statevector engine keeps
+    # the state reached here under checkpoint_key and later runs resume from a copy of it
+
+    def __init__(self, checkpoint_key, qubit, circ=None):
+        super().__init__("checkpoint", [], [qubit], circ)
+        self.checkpoint_key = checkpoint_key
+
+
+def checkpoint(qc, checkpoint_key, qubit):
+    return qc._attach(CheckpointGate(checkpoint_key, qubit, qc))
+
+
+class MultiControlledGate(Gate):
+    # mcx, mcz or mcry(theta) on the target when all controls are set, applied directly by the
+    # engines instead of a Toffoli ladder over ancillas
+
+    def __init__(self, name, param, ctrl, tgt, circ=None):
+        super().__init__(name, param, ctrl + [tgt], circ)
+
+
+def mcx(qc, ctrl, tgt):
+    return qc._attach(MultiControlledGate("mcx", [], ctrl, tgt, qc))
+
+
+def mcz(qc, ctrl, tgt):
+    return qc._attach(MultiControlledGate("mcz", [], ctrl, tgt, qc))
+
+
+def mcry(qc, theta, ctrl, tgt):
+    return qc._attach(MultiControlledGate("mcry", [theta], ctrl, tgt, qc))
+
+
+class QFTGate(Gate):
+    # The exact qft or iqft of circuit_util on qubits as one op, which the engines apply with numpy.fft
+
+    def __init__(self, name, qubits, circ=None):
+        super().__init__(name, [], qubits, circ)
+
+
+def qft_block(qc, qubits, inverse = False):
+    return qc._attach(QFTGate("iqft" if inverse else "qft", qubits, qc))
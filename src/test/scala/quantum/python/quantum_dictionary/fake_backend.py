@@ -0,0 +1,116 @@
+import time
+import threading
+
+from statevector import StatevectorResult, simulate
+
+
+NAME = 'fake_remote_backend'
+# account url of the 'fake' profile, registered with register_fake_remote instead of qiskit
+URL = 'fake://remote'
+
+
+class FakeRemoteBackend():
+    # Stands in for a remote device: every job waits in a queue before it runs locally
+    #
+    # queue_latency (seconds) can be overridden per Qconfig profile; jobs and registrations count
+    # the submissions and account registrations, so tests can check that repeated queries do not
+    # resubmit or reconnect.
+
+    def __init__(self, queue_latency = 0.5):
+        self.queue_latency = queue_latency
+        self.jobs = 0
+        self.registrations = 0
+        self.lock = threading.Lock()
+
+    def register(self, token, url, hub = None, group = None, project = None):
+        with self.lock:
+            self.registrations += 1
+
+    def __queue(self, cfg):
+        with self.lock:
+            self.jobs += 1
+        time.sleep(self.queue_latency if cfg is None else cfg.get('queue_latency', self.queue_latency))
+
+    def __simulate(self, qc, shots, cfg):
+        return StatevectorResult(simulate(qc).statevector, qc, shots, None if cfg is None else cfg.get('seed'))
+
+    def run(self, qc, shots = 1, cfg = None):
+        self.__queue(cfg)
+        return self.__simulate(qc, shots, cfg)
+
+    def run_batch(self, circuits, shots = 1, cfg = None):
+        # several circuits in one job, so one queue wait
+        self.__queue(cfg)
+        return [self.__simulate(qc, shots, cfg) for qc in circuits]
+
+
+fake_remote = FakeRemoteBackend()
+
+
+def register_fake_remote(token, url, hub = None, group = None, project = None):
+    # stands in for qiskit's register
+    fake_remote.register(token, url, hub, group, project)
+
+
+def run_fake_remote(qc, shots = 1, cfg = None):
+    return fake_remote.run(qc, shots, cfg)
+
+
+def run_fake_remote_batch(circuits, shots = 1, cfg = None):
+    return fake_remote.run_batch(circuits, shots, cfg)
+
+
+if __name__ == "__main__":
+    from qiskit import QuantumRegister, ClassicalRegister, QuantumCircuit
+
+    from Qconfig import cfg as Qcfg
+
+    # the session runs the fake_backend module's fake_remote, not this script's __main__ copy
+    import fake_backend
+    from session import session
+    from util import get_sampler
+
+    def bell(name):
+        q = QuantumRegister(2, name='q')
+        c = ClassicalRegister(2, name='c')
+        qc = QuantumCircuit(q, c, name=name)
+        qc.h(q[0])
+        qc.cx(q[0], q[1])
+        qc.measure(q, c)
+        return qc
+
+    def submissions():
+        return fake_backend.fake_remote.jobs, session.registrations
+
+    def registered_once():
+        # the 'fake' account, registered by the first query only
+        assert(session.registrations == 1)
+        assert(fake_backend.fake_remote.registrations == 1)
+
+    def test_batch():
+        # two circuits, one job per query
+        before = submissions()
+        for _ in range(2):
+            counts = session.run_counts(1000, [bell('a'), bell('b')], Qcfg['fake'])
+            print(sorted(counts[0]), sorted(counts[1]))
+        print("jobs, registrations:", before, "->", submissions())
+        registered_once()
+
+    def test_sampler():
+        # one simulation, then any number of shots without resubmitting
+        before = submissions()
+        sampler = get_sampler(bell('s'), 'fake')
+        assert(get_sampler(bell('s'), 'fake') is sampler)
+        print(sampler.counts(100, [(0, 0), (1, 1)], 2), sampler.counts(10000, [(0, 0), (1, 1)], 2))
+        print("jobs, registrations:", before, "->", submissions())
+        registered_once()
+
+    test_batch()
+    # [...] (available_backends, printed when the account registers)
+    # ['00', '11'] ['00', '11']
+    # ['00', '11'] ['00', '11']
+    # jobs, registrations: (0, 0) -> (2, 1)
+
+    test_sampler()
+    # {'00': ..., '11': ...} {'00': ..., '11': ...}
+    # jobs, registrations: (2, 1) -> (3, 1)
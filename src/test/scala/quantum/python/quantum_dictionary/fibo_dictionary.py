@@ -9,25 +9,30 @@ class QFiboDictionary(QDictionary):
     # A Quantum Dictionary built from a function
 
     @staticmethod
-    def prepare(_, circuit, key, value, ancilla, extra):
+    def prepare(_, circuit, key, value, ancilla, extra, qft_degree = None):
         for i in range(len(value)):
             for j in range(len(key) - 1):
                 controlled_ry(circuit, 1/2 ** len(value) * 2 * np.pi * 2 ** (i + 1),
                               [key[j], key[j+1], value[i]], extra, ancilla[0])  # sum on powers of 2
 
-        iqft(circuit, [value[i] for i in range(len(value))])
+        iqft(circuit, [value[i] for i in range(len(value))], qft_degree)
 
     @staticmethod
-    def unprepare(_, circuit, key, value, ancilla, extra):
-        qft(circuit, [value[i] for i in range(len(value))])
+    def unprepare(_, circuit, key, value, ancilla, extra, qft_degree = None):
+        qft(circuit, [value[i] for i in range(len(value))], qft_degree)
 
         for i in range(len(value)):
             for j in range(len(key) - 1):
                 controlled_ry(circuit, -1/2 ** len(value) * 2 * np.pi * 2 ** (i + 1),
                               [key[j], key[j+1], value[i]], extra, ancilla[0])  # sum on powers of 2
 
-    def __init__(self, key_bits, value_bits, precision_bits, d):
-        QDictionary.__init__(self, key_bits, value_bits, precision_bits, d, QFiboDictionary.prepare, QFiboDictionary.unprepare)
+    def __init__(self, key_bits, value_bits, precision_bits, d, qft_degree = None):
+        QDictionary.__init__(self, key_bits, value_bits, precision_bits, d, QFiboDictionary.prepare, QFiboDictionary.unprepare, qft_degree)
+
+    @staticmethod
+    def value_bounds(key_bits, _):
+        # the number of adjacent pairs of set key bits
+        return 0, max(key_bits - 1, 0)
 
 
 if __name__ == "__main__":
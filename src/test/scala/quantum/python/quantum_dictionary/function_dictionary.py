@@ -1,29 +1,44 @@
 import numpy as np
 
-from circuit_util import on_match_ry, qft, iqft
+from circuit_util import function_rotations, qft, iqft
+from engine_gates import encode_function
 from quantum_dictionary import QDictionary
 
 class QFunctionDictionary(QDictionary):
     # A Quantum Dictionary built from a function
 
     @staticmethod
-    def prepare(f, circuit, key, value, ancilla, extra):
-        for i in range(len(value)):
-            for k in range(2**len(key)):
-                on_match_ry(len(key), k, circuit, 1/2 ** len(value) * 2 * np.pi * 2 ** (i+1) * f[k], [key[j] for j in range(0, len(key))] + [value[i]], extra, ancilla)
+    def prepare(f, circuit, key, value, ancilla, extra, qft_degree = None):
+        function_rotations(circuit, f, [key[j] for j in range(len(key))], [value[i] for i in range(len(value))], ancilla[0])
 
-        iqft(circuit, [value[i] for i in range(len(value))])
+        iqft(circuit, [value[i] for i in range(len(value))], qft_degree)
 
     @staticmethod
-    def unprepare(f, circuit, key, value, ancilla, extra):
-        qft(circuit, [value[i] for i in range(len(value))])
+    def unprepare(f, circuit, key, value, ancilla, extra, qft_degree = None):
+        qft(circuit, [value[i] for i in range(len(value))], qft_degree)
 
-        for i in range(len(value)):
-            for k in range(2**len(key)):
-                on_match_ry(len(key), k, circuit, -1/2 ** len(value) * 2 * np.pi * 2 ** (i+1) * f[k], [key[j] for j in range(0, len(key))] + [value[i]], extra, ancilla)
+        function_rotations(circuit, [-f[k] for k in range(2**len(key))], [key[j] for j in range(len(key))], [value[i] for i in range(len(value))], ancilla[0])
 
-    def __init__(self, key_bits, value_bits, precision_bits, f):
-        QDictionary.__init__(self, key_bits, value_bits, precision_bits, f, QFunctionDictionary.prepare, QFunctionDictionary.unprepare)
+    # direct encoding: the rotations above as a single op that the in-repo engines apply to the
+    # whole statevector at once, |k>|v> -> |k>|f(k) + v mod 2^m> after the inverse QFT
+
+    @staticmethod
+    def prepare_direct(f, circuit, key, value, ancilla, extra, qft_degree = None):
+        encode_function(circuit, f, [key[j] for j in range(len(key))], [value[i] for i in range(len(value))], ancilla[0])
+
+        iqft(circuit, [value[i] for i in range(len(value))], qft_degree)
+
+    @staticmethod
+    def unprepare_direct(f, circuit, key, value, ancilla, extra, qft_degree = None):
+        qft(circuit, [value[i] for i in range(len(value))], qft_degree)
+
+        encode_function(circuit, [-f[k] for k in range(2**len(key))], [key[j] for j in range(len(key))], [value[i] for i in range(len(value))], ancilla[0])
+
+    def __init__(self, key_bits, value_bits, precision_bits, f, direct = False, qft_degree = None):
+        if direct:
+            QDictionary.__init__(self, key_bits, value_bits, precision_bits, f, QFunctionDictionary.prepare_direct, QFunctionDictionary.unprepare_direct, qft_degree)
+        else:
+            QDictionary.__init__(self, key_bits, value_bits, precision_bits, f, QFunctionDictionary.prepare, QFunctionDictionary.unprepare, qft_degree)
 
     @staticmethod
     def random(key_bits, value_bits):
@@ -0,0 +1,107 @@
+import numpy as np
+
+from statevector import H, rx_matrix, ry_matrix
+
+
+I = np.eye(2, dtype=np.complex128)
+X = np.array([[0, 1], [1, 0]], dtype=np.complex128)
+Z = np.diag([1, -1]).astype(np.complex128)
+SWAP = np.eye(4, dtype=np.complex128)[[0, 2, 1, 3]]
+
+
+def controlled_matrix(u):
+    # basis index 2 * control + target
+    m = np.eye(4, dtype=np.complex128)
+    m[2:, 2:] = u
+    return m
+
+
+def gate_matrix(name, params):
+    # matrix of a gate the pass can fuse, None for everything else
+    if name == 'h':
+        return H
+    if name == 'x':
+        return X
+    if name == 'z':
+        return Z
+    if name == 'rx':
+        return rx_matrix(params[0])
+    if name == 'ry':
+        return ry_matrix(params[0])
+    if name == 'u1':
+        return np.diag([1, np.exp(1j * params[0])])
+    if name == 'cx':
+        return controlled_matrix(X)
+    if name == 'cz':
+        return controlled_matrix(Z)
+    if name == 'cu1':
+        return controlled_matrix(np.diag([1, np.exp(1j * params[0])]))
+    if name == 'unitary':
+        return params
+    return None
+
+
+def embed(u, qubits, block_qubits):
+    # u acting on qubits, expressed on the (one or two) block qubits
+    if len(qubits) == len(block_qubits):
+        return u if list(qubits) == list(block_qubits) else SWAP @ u @ SWAP
+    return np.kron(u, I) if qubits[0] == block_qubits[0] else np.kron(I, u)
+
+
+def fuse(ops):
+    # Fuses runs of gates on the same one or two qubits into single 'unitary' ops.
+    #
+    # Every qubit has at most one open block. A fusible gate joins the blocks on its qubits when
+    # they span at most two qubits together, otherwise those blocks are emitted first. Blocks on
+    # other qubits stay open since they commute with the gate. Returns the fused ops and the
+    # number of ops eliminated.
+    fused = []
+    blocks = {}
+
+    def flush(block):
+        for q in block['qubits']:
+            del blocks[q]
+        if len(block['ops']) == 1:
+            fused.append(block['ops'][0])
+        else:
+            fused.append(('unitary', block['matrix'], tuple(block['qubits'])))
+
+    for op in ops:
+        name, params, qubits = op
+        u = gate_matrix(name, params) if len(qubits) <= 2 else None
+
+        touched = []
+        for q in qubits:
+            if q in blocks and blocks[q] not in touched:
+                touched.append(blocks[q])
+
+        if u is None:
+            for block in touched:
+                flush(block)
+            fused.append(op)
+            continue
+
+        block_qubits = [q for block in touched for q in block['qubits']]
+        block_qubits += [q for q in qubits if q not in block_qubits]
+        if len(block_qubits) > 2:
+            for block in touched:
+                flush(block)
+            touched = []
+            block_qubits = list(qubits)
+
+        matrix = np.ones((1, 1), dtype=np.complex128)
+        block_ops = []
+        for block in touched:
+            matrix = np.kron(matrix, block['matrix'])
+            block_ops += block['ops']
+        while matrix.shape[0] < 2**len(block_qubits):
+            matrix = np.kron(matrix, I)
+
+        block = {'qubits': block_qubits, 'matrix': embed(u, qubits, block_qubits) @ matrix, 'ops': block_ops + [op]}
+        for q in block_qubits:
+            blocks[q] = block
+
+    for block in list({id(b): b for b in blocks.values()}.values()):
+        flush(block)
+
+    return fused, len(ops) - len(fused)
@@ -2,24 +2,25 @@ import numpy as np
 
 from circuit_util import controlled_ry, qft, iqft
 
+from bounds import subset_sum_range
 from quantum_dictionary import QDictionary
 
 class QPartitionDictionary(QDictionary):
     # A Quantum Dictionary built from a function
 
     @staticmethod
-    def prepare(f, circuit, key, value, ancilla, extra):
+    def prepare(f, circuit, key, value, ancilla, extra, qft_degree = None):
         # controlled rotations only n powers of 2
         for i in range(len(value)):
             for j in range(len(key)):
                 controlled_ry(circuit, 1/2 ** len(value) * 2 * np.pi * 2 ** (i + 1) * f[j],
                               [key[j], value[i]], extra, ancilla[0])  # sum on powers of 2
 
-        iqft(circuit, [value[i] for i in range(len(value))])
+        iqft(circuit, [value[i] for i in range(len(value))], qft_degree)
 
     @staticmethod
-    def unprepare(f, circuit, key, value, ancilla, extra):
-        qft(circuit, [value[i] for i in range(len(value))])
+    def unprepare(f, circuit, key, value, ancilla, extra, qft_degree = None):
+        qft(circuit, [value[i] for i in range(len(value))], qft_degree)
 
         # controlled rotations only n powers of 2
         for i in range(len(value)):
@@ -27,8 +28,12 @@ class QPartitionDictionary(QDictionary):
                 controlled_ry(circuit, -1/2 ** len(value) * 2 * np.pi * 2 ** (i + 1) * f[j],
                               [key[j], value[i]], extra, ancilla[0])  # sum on powers of 2
 
-    def __init__(self, key_bits, value_bits, precision_bits, f):
-        QDictionary.__init__(self, key_bits, value_bits, precision_bits, f, QPartitionDictionary.prepare, QPartitionDictionary.unprepare)
+    def __init__(self, key_bits, value_bits, precision_bits, f, qft_degree = None):
+        QDictionary.__init__(self, key_bits, value_bits, precision_bits, f, QPartitionDictionary.prepare, QPartitionDictionary.unprepare, qft_degree)
+
+    @staticmethod
+    def value_bounds(key_bits, f):
+        return subset_sum_range([f[j] for j in range(key_bits)])
 
     def get_zero_sum_count(self):
         return QDictionary.get_zero_count(self) - 1
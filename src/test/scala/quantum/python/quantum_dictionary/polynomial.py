@@ -0,0 +1,101 @@
+from qiskit import QuantumRegister, QuantumCircuit
+
+import numpy as np
+
+from bounds import table_range, twos_complement_bits, zeta
+from circuit_util import native_qft, qft_rotations, walsh_hadamard
+from function_dictionary import QFunctionDictionary
+from quantum_dictionary import extra_register, registers
+from qubo_dictionary import QQUBODictionary
+from resources import circuit_resources
+
+
+# Compiles a dense function table into the pseudo-Boolean polynomial that QQUBODictionary encodes
+# with one rotation per term, and picks whichever of the two encodings takes fewer gates.
+#
+#   polynomial_terms([0, -15, 1, -23, 12, -3, 16, -8], 3)  # {0: 12, 1: 1, 2: -15, (0, 1): 3, (1, 2): -9}
+#   qd = compile_function_dictionary(3, 6, 0, [0, -15, 1, -23, 12, -3, 16, -8])
+#   qd.encoding['encoding'], qd.encoding['reason']
+
+
+def polynomial_terms(f, key_bits, tolerance = 1e-9):
+    # the nonzero coefficients as a QQUBODictionary dict: -1 for the constant, j for key[j],
+    # tuples of key positions for products; key[0] is the most significant bit of a key
+    c = zeta([f[k] for k in range(2**key_bits)], inverse=True)
+    d = {}
+    for s in np.flatnonzero(np.abs(c) > tolerance):
+        variables = tuple(j for j in range(key_bits) if s & (1 << (key_bits - 1 - j)))
+        coefficient = c[s].item()
+        if coefficient == int(coefficient):
+            coefficient = int(coefficient)
+        if len(variables) == 0:
+            d[-1] = coefficient
+        elif len(variables) == 1:
+            d[variables[0]] = coefficient
+        else:
+            d[variables] = coefficient
+    return d
+
+
+def degree(d):
+    return max([len(k) if isinstance(k, tuple) else (0 if k == -1 else 1) for k in d], default=0)
+
+
+def prepare_resources(prepare, f, key_bits, value_bits):
+    # resources of one prepare stage of a dictionary, on a scratch circuit
+    key = QuantumRegister(key_bits, name='key')
+    value = QuantumRegister(value_bits, name='value')
+    ancilla = QuantumRegister(1, name='ancilla')
+    extra = extra_register(max(key_bits, value_bits))
+    circuit = QuantumCircuit(*registers(key, value, ancilla, extra))
+    prepare(f, circuit, key, value, ancilla, extra)
+    return circuit_resources(circuit)
+
+
+def table_gates(f, key_bits, value_bits):
+    # gates of QFunctionDictionary.prepare in closed form: function_rotations applies m + 1
+    # uniformly controlled rotations of 2^n cx (none without key bits) and one ry per nonzero
+    # scaled Walsh weight, 2m cx around them, then the iqft
+    n, m = key_bits, value_bits
+    weights = walsh_hadamard([f[k] for k in range(2**n)]) / 2**n
+    c = [4 * np.pi * 2**i / 2**m for i in range(m)]
+    scales = [sum(c) / 2] + [-ci / 2 for ci in c]
+    ry = sum(np.count_nonzero(~np.isclose(weights * scale, 0)) for scale in scales)
+    cx = (m + 1) * (2**n if n > 0 else 0) + 2 * m
+    return ry + cx + (1 if native_qft() else m + qft_rotations(m))
+
+
+def choose_encoding(f, key_bits, value_bits, tolerance = 1e-9):
+    # report of the cheaper encoding of f: 'polynomial' (a QQUBODictionary dict) or 'table'
+    d = QQUBODictionary.order_by_prefix(polynomial_terms(f, key_bits, tolerance))
+    table = table_gates(f, key_bits, value_bits)
+    report = {'terms': len(d), 'degree': degree(d), 'table_gates': table, 'polynomial_gates': None}
+
+    polynomial = prepare_resources(QQUBODictionary.prepare, d, key_bits, value_bits)
+    report['polynomial_gates'] = polynomial['gates']
+    if polynomial['gates'] < table:
+        report.update(encoding='polynomial', f=d,
+                      reason="%d terms of degree <= %d take %d gates against %d for the table"
+                             % (len(d), degree(d), polynomial['gates'], table))
+    else:
+        report.update(encoding='table', f=f,
+                      reason="%d terms take %d gates against %d for the table"
+                             % (len(d), polynomial['gates'], table))
+    return report
+
+
+def compile_function_dictionary(key_bits, value_bits, precision_bits, f, qft_degree = None, tolerance = 1e-9):
+    # a QQUBODictionary for f when its polynomial is cheaper, a QFunctionDictionary otherwise;
+    # the choice is kept in the dictionary's encoding
+    if value_bits is None:
+        value_bits = twos_complement_bits(*table_range(f, key_bits))
+    report = choose_encoding(f, key_bits, value_bits, tolerance)
+    if report['encoding'] == 'polynomial':
+        qd = QQUBODictionary(key_bits, value_bits, precision_bits, report['f'], qft_degree)
+    else:
+        qd = QFunctionDictionary(key_bits, value_bits, precision_bits, f, qft_degree=qft_degree)
+    qd.encoding = report
+
+    if qd.verbose:
+        print("Encoding:", report['encoding'], "-", report['reason'])
+    return qd
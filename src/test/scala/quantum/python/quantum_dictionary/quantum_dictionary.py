@@ -3,28 +3,64 @@ from qiskit import QuantumRegister, QuantumCircuit
 import numpy as np
 import math
 
-from circuit_util import qft, iqft, grover, oracle0, diffusion, get_oracle, oracle_first_bit_one
-from util import get_probs, plot_histogram
+from circuit_util import qft, iqft, grover, oracle0, diffusion, get_oracle, oracle_first_bit_one, native_controlled, native_qft
+from bounds import table_range, twos_complement_bits
+from circuit_cache import circuit_cache, content_hash
+from engine_gates import checkpoint
+from resources import CircuitResources, stage
+from result import DictionaryResult
+from util import get_distribution, get_probs, get_statevector, plot_histogram
+
+
+def extra_register(size):
+    # ancillas for the Toffoli ladders of circuit_util.controlled, none with native gates
+    return None if native_controlled() else QuantumRegister(size, name='extra')
+
+
+def registers(*regs):
+    return [r for r in regs if r is not None]
 
 
 class QDictionary():
     # A Quantum Dictionary
 
-    def __init__(self, key_bits, value_bits, precision_bits, f, prepare, unprepare = None):
+    # print and plot the outcomes of get_value_for_key / get_value_distribution
+    verbose = True
+
+    # CircuitResources of the circuit behind the last get_* call
+    resources = None
+
+    # what the QPE circuit would have counted, for the last exact get_value_count
+    qpe_count = None
+
+    def __init__(self, key_bits, value_bits, precision_bits, f, prepare, unprepare = None, qft_degree = None):
         self.key_bits = key_bits
+        if value_bits is None:
+            # just wide enough for every value as two's complement
+            bounds = self.value_bounds(key_bits, f)
+            value_bits = twos_complement_bits(*bounds)
+            if self.verbose:
+                print("Value bits:", value_bits, "for values in", bounds)
         self.value_bits = value_bits
         if precision_bits > 0:
             self.precision_bits = precision_bits
         self.f = f
         self.prepare = prepare
         self.unprepare = unprepare
+        # approximation degree of the value register qft/iqft, None for exact (see circuit_util.qft_error_report)
+        self.qft_degree = qft_degree
+
+    @staticmethod
+    def value_bounds(key_bits, f):
+        # exact (min, max) of the encoded function, a table of 2^key_bits values here
+        return table_range(f, key_bits)
 
     def __build_circuit(self, n_qbits, c_qbits, f, search_key = None):
-        key = QuantumRegister(n_qbits)
-        value = QuantumRegister(c_qbits)
-        ancilla = QuantumRegister(1)
-        extra = QuantumRegister(max(n_qbits, c_qbits))
-        circuit = QuantumCircuit(key, value, ancilla, extra)
+        key = QuantumRegister(n_qbits, name='key')
+        value = QuantumRegister(c_qbits, name='value')
+        ancilla = QuantumRegister(1, name='ancilla')
+        extra = extra_register(max(n_qbits, c_qbits))
+        circuit = QuantumCircuit(*registers(key, value, ancilla, extra))
 
         def prepare_once():
             circuit.h(key)
@@ -37,27 +73,31 @@ class QDictionary():
         def unprepare_once():
             circuit.rx(-np.pi/2, ancilla[0])
 
-        prepare_once()
+        with stage(circuit, 'prepare_once'):
+            prepare_once()
 
         if search_key is not None:
             iterations = 1 if n_qbits == 2 else 2**(math.floor(n_qbits/2))
             for i in range(iterations):
-                grover(search_key, circuit, key, extra, ancilla)
+                with stage(circuit, 'grover'):
+                    grover(search_key, circuit, key, extra, ancilla)
 
-        self.prepare(f, circuit, key, value, ancilla, extra)
+        with stage(circuit, 'prepare'):
+            self.prepare(f, circuit, key, value, ancilla, extra, self.qft_degree)
 
-        unprepare_once()
+        with stage(circuit, 'unprepare_once'):
+            unprepare_once()
 
 
         return circuit
 
     def __build_circuit_count(self, n_qbits, c_qbits, f, oracle):
-        key = QuantumRegister(n_qbits)
-        value = QuantumRegister(c_qbits)
-        ancilla = QuantumRegister(1)
-        extra = QuantumRegister(6)
-        precision = QuantumRegister(self.precision_bits)
-        circuit = QuantumCircuit(precision, key, value, ancilla, extra)
+        key = QuantumRegister(n_qbits, name='key')
+        value = QuantumRegister(c_qbits, name='value')
+        ancilla = QuantumRegister(1, name='ancilla')
+        extra = extra_register(6)
+        precision = QuantumRegister(self.precision_bits, name='precision')
+        circuit = QuantumCircuit(*registers(precision, key, value, ancilla, extra))
 
         # TODO make arguments
         def prepare_once():
@@ -74,101 +114,197 @@ class QDictionary():
             circuit.rx(-np.pi/2, ancilla[0])
 
         # amplitude estimation (counting) algorithm
-        prepare_once()
+        with stage(circuit, 'prepare_once'):
+            prepare_once()
+        with stage(circuit, 'prepare'):
+            self.prepare(f, circuit, key, value, ancilla, extra, self.qft_degree)
+        # the same for every oracle, the engine snapshots the state here
+        checkpoint(circuit, self.__cache_prefix() + ('count',), ancilla[0])
         for i in range(len(precision)):
-            for _ in range(2**i):
+            for r in range(2**i):
                 # oracle
-                self.prepare(f, circuit, key, value, ancilla, extra)
+                if i > 0 or r > 0:
+                    with stage(circuit, 'prepare'):
+                        self.prepare(f, circuit, key, value, ancilla, extra, self.qft_degree)
                 if oracle is not None:
-                    oracle(circuit, [precision[i]], value, extra, ancilla)
-                self.unprepare(f, circuit, key, value, ancilla, extra)
+                    with stage(circuit, 'oracle'):
+                        oracle(circuit, [precision[i]], value, extra, ancilla)
+                with stage(circuit, 'unprepare'):
+                    self.unprepare(f, circuit, key, value, ancilla, extra, self.qft_degree)
 
                 # diffusion
-                diffusion(circuit, [precision[i]], [key[i] for i in range(len(key))], extra) # if f(0) = 0
+                with stage(circuit, 'diffusion'):
+                    diffusion(circuit, [precision[i]], [key[i] for i in range(len(key))], extra) # if f(0) = 0
                 # diffusion(circuit, [precision[i]], [key[i] for i in range(len(key))] + [value[i] for i in range(len(value))], extra)
         # inverse fourier tranform
-        iqft(circuit, [precision[i] for i in range(len(precision))])
-        unprepare_once()
+        with stage(circuit, 'iqft'):
+            iqft(circuit, [precision[i] for i in range(len(precision))])
+        with stage(circuit, 'unprepare_once'):
+            unprepare_once()
 
         return circuit
 
-    def __process(self, n_bits, c_bits, probs, neg=False):
-        kvs = {}
-        entries = {}
-        outcomes = {}
-        for b, c in probs.items():
-            key = int(b[0:n_bits], 2)
-            value = int(b[n_bits:n_bits + c_bits], 2)
-            kvs[key] = value
-            if neg is True and value >= 2**(c_bits-1):
-                value = value - 2**c_bits
-            entries[key] = '%d' % key + " = " + b[0:n_bits] + " -> " + b[n_bits:n_bits + c_bits] + " = " + '%d' % value
-            outcomes['%d' %  key + " -> " + '%d' % value] = c
-
-        for v in sorted(entries.items(), key=lambda x: x[1]):
-            print(v[1])
-        return sorted(kvs.items(), key=lambda x: x[1]), outcomes
-
-    def __process_values(self, n_bits, c_bits, probs):
-        value_freq = {}
-        for b, c in probs.items():
-            value = int(b[n_bits:n_bits + c_bits], 2)
-            value_freq[value] = value_freq.get(value, 0) + c
-
-        factor=1.0/sum(value_freq.values())
-        value_freq = {k: v*factor for k, v in value_freq.items()}
-
-        return value_freq
-
-    def get_value_distribution(self):
-        circuit = self.__build_circuit(self.key_bits, self.value_bits, self.f)
-        probs = get_probs((circuit, None, None), 'sim', False)
+    def __build_circuit_exact(self, n_qbits, c_qbits, f, oracle):
+        # the counting circuit without precision register and repetitions: prepare, then the oracle
+        key = QuantumRegister(n_qbits, name='key')
+        value = QuantumRegister(c_qbits, name='value')
+        ancilla = QuantumRegister(1, name='ancilla')
+        # the ancillas of __build_circuit_count, whose oracle has one control more
+        extra = extra_register(6)
+        circuit = QuantumCircuit(*registers(key, value, ancilla, extra))
 
-        ordered_probs = sorted(probs.items(), key=lambda x: x[1], reverse=True)
-        print("Probabilities: ", ordered_probs)
+        with stage(circuit, 'prepare_once'):
+            circuit.h(key)
+            circuit.h(value)
 
-        v_freq = self.__process_values(self.key_bits, self.value_bits, probs)
+            # eigenvector for Ry
+            circuit.rx(np.pi/2, ancilla[0])
+            circuit.z(ancilla[0])
+            circuit.x(ancilla[0])
+
+        with stage(circuit, 'prepare'):
+            self.prepare(f, circuit, key, value, ancilla, extra, self.qft_degree)
+        checkpoint(circuit, self.__cache_prefix() + ('exact',), ancilla[0])
+
+        if oracle is not None:
+            with stage(circuit, 'oracle'):
+                oracle(circuit, [], value, extra, ancilla)
+
+        return circuit
 
-        from qiskit.tools import visualization
-        visualization.plot_histogram(v_freq)
+    def __cache_prefix(self):
+        return (type(self), self.prepare, self.unprepare, self.key_bits, self.value_bits,
+                getattr(self, 'precision_bits', 0), content_hash(self.f), native_controlled(), native_qft(), self.qft_degree)
 
-        ordered_freq = sorted(v_freq.items(), key=lambda x: x[1], reverse=True)
+    def __circuit(self, search_key = None):
+        return circuit_cache.get(self.__cache_prefix() + ('key', search_key),
+                                 lambda: self.__build_circuit(self.key_bits, self.value_bits, self.f, search_key))
 
-        print("Value Distribution", ordered_freq)
+    def __circuit_count(self, oracle):
+        return circuit_cache.get(self.__cache_prefix() + ('count', oracle),
+                                 lambda: self.__build_circuit_count(self.key_bits, self.value_bits, self.f, oracle))
+
+    def __circuit_exact(self, oracle):
+        return circuit_cache.get(self.__cache_prefix() + ('exact', oracle),
+                                 lambda: self.__build_circuit_exact(self.key_bits, self.value_bits, self.f, oracle))
+
+    def get_circuit(self, search_key = None):
+        # the (cached) lookup circuit, or the counting circuit for an oracle, without running them
+        return self.__circuit(search_key)
+
+    def get_count_circuit(self, oracle):
+        return self.__circuit_count(oracle)
+
+    def invalidate(self):
+        # drops the cached circuits of the current f, call before mutating f in place
+        circuit_cache.invalidate(self.__cache_prefix())
+
+    def __account(self, circuit):
+        # the resources of the circuit behind the last get_* call
+        if not hasattr(circuit, 'resources'):
+            circuit.resources = CircuitResources(circuit)
+        self.resources = circuit.resources
+        return self.resources
+
+    def __result(self, circuit, neg = False):
+        indices, probs = get_distribution((circuit, None, None), 'sim', ('key', 'value'))
+        result = DictionaryResult(self.key_bits, self.value_bits, indices, probs, neg)
+        result.resources = self.__account(circuit)
+        return result
+
+    def get_value_distribution(self, neg = False):
+        result = self.__result(self.__circuit(), neg)
+
+        if self.verbose:
+            ordered_probs = sorted(result.bitstring_probabilities().items(), key=lambda x: x[1], reverse=True)
+            print("Probabilities: ", ordered_probs)
+
+            v_freq = result.value_frequencies()
+
+            from qiskit.tools import visualization
+            visualization.plot_histogram(v_freq)
+
+            ordered_freq = sorted(v_freq.items(), key=lambda x: x[1], reverse=True)
+            print("Value Distribution", ordered_freq)
+
+        return result
 
     def get_value_for_key(self, key, neg = False):
-        circuit = self.__build_circuit(self.key_bits, self.value_bits, self.f, key)
-        probs = get_probs((circuit, None, None), 'sim', False)
+        result = self.__result(self.__circuit(key), neg)
 
-        from qiskit.tools import visualization
-        visualization.plot_histogram(probs)
+        if self.verbose:
+            probs = result.bitstring_probabilities()
 
-        ordered_probs = sorted(probs.items(), key=lambda x: x[1], reverse=True)
-        print("Probabilities: ", ordered_probs)
+            from qiskit.tools import visualization
+            visualization.plot_histogram(probs)
+
+            ordered_probs = sorted(probs.items(), key=lambda x: x[1], reverse=True)
+            print("Probabilities: ", ordered_probs)
+
+            print(result)
+            ordered_outcomes = sorted(result.outcome_probabilities().items(), key=lambda x: x[1], reverse=True)
+            print("Outcomes", ordered_outcomes)
+
+        return result
+
+    def get_values_for_keys(self, keys, neg = False):
+        # every key is read from one run of the key-independent circuit instead of a grover search per key
+        circuit = self.__circuit()
+        self.__account(circuit)
+        indices, probs = get_distribution((circuit, None, None), 'sim', ('key', 'value'), None)
+        values = DictionaryResult(self.key_bits, self.value_bits, indices, probs, neg).lookup(keys)
+
+        if self.verbose:
+            print("Values", list(zip(values['key'].tolist(), values['signed_value' if neg else 'value'].tolist())))
 
-        _, outcomes = self._QDictionary__process(self.key_bits, self.value_bits, probs, neg)
-        ordered_outcomes = sorted(outcomes.items(), key=lambda x: x[1], reverse=True)
+        return values
 
-        print("Outcomes", ordered_outcomes)
-        return ordered_probs[0][0]
+    def get_zero_count(self, exact = False):
+        return self.get_value_count(oracle0, exact)
 
-    def get_zero_count(self):
-        return self.get_value_count(oracle0)
+    def get_count_for_value(self, v, exact = False):
+        return self.get_value_count(get_oracle(v), exact)
 
-    def get_count_for_value(self, v):
-        return self.get_value_count(get_oracle(v))
+    def get_negative_value_count(self, exact = False):
+        return self.get_value_count(oracle_first_bit_one, exact)
 
-    def get_negative_value_count(self):
-        return self.get_value_count(oracle_first_bit_one)
+    def get_value_count(self, oracle, exact = False):
+        # the count as an int in both modes; the exact one also sets self.qpe_count (None
+        # without a precision register)
+        if exact:
+            amplitude, estimate = self.get_value_amplitude(oracle, True)
+            count = int(round(2**self.key_bits*amplitude))
+            self.qpe_count = None if estimate is None else int(round(2**self.key_bits*estimate))
+            print("Count =", count, "QPE Count =", self.qpe_count)
+            return count
 
-    def get_value_count(self, oracle):
         count = int(round(2**self.key_bits*self.get_value_amplitude(oracle)))
         print("Count =", count)
         return count
 
-    def get_value_amplitude(self, oracle):
-        circuit = self.__build_circuit_count(self.key_bits, self.value_bits, self.f, oracle)
-        probs = get_probs((circuit, None, None), 'sim', False)
+    def __exact_amplitude(self, oracle):
+        # the oracle flips the sign of the marked states, so <psi|O|psi> = 1 - 2 * amplitude
+        prepared = get_statevector((self.__circuit_exact(None), None, None), 'sim')
+        marked = get_statevector((self.__circuit_exact(oracle), None, None), 'sim')
+        self.__account(self.__circuit_exact(oracle))
+        amplitude = (1 - np.real(np.vdot(prepared, marked)))/2
+        print("Exact Amplitude = ", amplitude)
+
+        # what the most likely precision register outcome would read
+        estimate = None
+        if getattr(self, 'precision_bits', 0) > 0:
+            k = round(2**self.precision_bits*np.arccos(np.sqrt(np.clip(amplitude, 0, 1)))/np.pi)
+            estimate = round(np.cos(np.pi*k/2**self.precision_bits)**2, 4)
+            print("QPE Equivalent Estimate = ", estimate)
+        return amplitude, estimate
+
+    def get_value_amplitude(self, oracle, exact = False):
+        if exact:
+            return self.__exact_amplitude(oracle)
+
+        circuit = self.__circuit_count(oracle)
+        self.__account(circuit)
+        probs = get_probs((circuit, None, None), 'sim', False, ('precision',))
         ordered_probs = sorted(probs.items(), key=lambda x: x[1], reverse=True)
         print("number of outcomes:", len(ordered_probs))
         print("probabilities = ", ordered_probs)
@@ -2,38 +2,51 @@ from qiskit import QuantumRegister, QuantumCircuit
 
 import numpy as np
 
-from circuit_util import on_match_ry, qft, is_bit_not_set, controlled_X, controlled_Z, czxzx, controlled, iqft
-from util import get_probs, plot_histogram
+from circuit_util import function_rotations, qft, is_bit_not_set, controlled_X, controlled_Z, czxzx, controlled, iqft
+from bounds import table_range, twos_complement_bits
+from quantum_dictionary import extra_register, registers
+from resources import CircuitResources, stage
+from result import DictionaryResult
+from util import get_distribution, plot_histogram
 
 
 class QValueSearchDictionary():
     # A Quantum Dictionary
 
-    def __init__(self, key_bits, value_bits, f):
+    # print and plot the outcomes of get_value_for_key / get_value_distribution
+    verbose = True
+
+    # CircuitResources of the circuit behind the last get_* call
+    resources = None
+
+    def __init__(self, key_bits, value_bits, f, qft_degree = None):
         self.key_bits = key_bits
+        if value_bits is None:
+            value_bits = twos_complement_bits(*table_range(f, key_bits))
         self.value_bits = value_bits
         self.f = f
+        self.qft_degree = qft_degree
 
-    def prepare(self, f, circuit, key, value, ancilla, extra):
-        for i in range(len(value)):
-            for k in range(2**len(key)):
-                on_match_ry(len(key), k, circuit, 1/2 ** len(value) * 2 * np.pi * 2 ** (i+1) * f[k], [key[j] for j in range(0, len(key))] + [value[i]], extra, ancilla)
+    def prepare(self, f, circuit, key, value, ancilla, extra, qft_degree = None):
+        function_rotations(circuit, f, [key[j] for j in range(len(key))], [value[i] for i in range(len(value))], ancilla[0])
 
-        iqft(circuit, [value[i] for i in range(len(value))])
+        iqft(circuit, [value[i] for i in range(len(value))], qft_degree)
 
-    def unprepare(self, f, circuit, key, value, ancilla, extra):
-        qft(circuit, [value[i] for i in range(len(value))])
+    def unprepare(self, f, circuit, key, value, ancilla, extra, qft_degree = None):
+        qft(circuit, [value[i] for i in range(len(value))], qft_degree)
 
-        for i in range(len(value)):
-            for k in range(2**len(key)):
-                on_match_ry(len(key), k, circuit, -1/2 ** len(value) * 2 * np.pi * 2 ** (i+1) * f[k], [key[j] for j in range(0, len(key))] + [value[i]], extra, ancilla)
+        function_rotations(circuit, [-f[k] for k in range(2**len(key))], [key[j] for j in range(len(key))], [value[i] for i in range(len(value))], ancilla[0])
+
+    def get_circuit(self, search_key = None):
+        # the lookup circuit, without running it
+        return self.__build_circuit(self.key_bits, self.value_bits, self.f, search_key)
 
     def __build_circuit(self, n_qbits, c_qbits, f, search_key):
-        key = QuantumRegister(n_qbits)
-        value = QuantumRegister(c_qbits)
-        ancilla = QuantumRegister(1)
-        extra = QuantumRegister(max(n_qbits, c_qbits) + 1)
-        circuit = QuantumCircuit(key, value, ancilla, extra)
+        key = QuantumRegister(n_qbits, name='key')
+        value = QuantumRegister(c_qbits, name='value')
+        ancilla = QuantumRegister(1, name='ancilla')
+        extra = extra_register(max(n_qbits, c_qbits) + 1)
+        circuit = QuantumCircuit(*registers(key, value, ancilla, extra))
 
         def prepare_once():
             circuit.h(key)
@@ -46,25 +59,30 @@ class QValueSearchDictionary():
         def unprepare_once():
             circuit.rx(-np.pi/2, ancilla[0])
 
-        prepare_once()
+        with stage(circuit, 'prepare_once'):
+            prepare_once()
 
         # if search_key is not None:
         #     iterations = 1 if n_qbits == 2 else 2**(math.floor(n_qbits/2))
         #     for i in range(iterations):
         #         grover(search_key, circuit, key, extra, ancilla)
 
-        self.prepare(f, circuit, key, value, ancilla, extra)
+        with stage(circuit, 'prepare'):
+            self.prepare(f, circuit, key, value, ancilla, extra, self.qft_degree)
 
         if search_key is not None:
             for i in range(1):
-                self.grover(search_key, circuit, [key[i] for i in range(len(key))] + [value[i] for i in range(len(value))],
+                with stage(circuit, 'grover'):
+                    self.grover(search_key, circuit, [key[i] for i in range(len(key))] + [value[i] for i in range(len(value))],
                             [value[i] for i in range(len(value))], extra, ancilla)
         else:
             for i in range(1):
-                self.grover_n(circuit, key, value, [value[0]], extra, ancilla)
+                with stage(circuit, 'grover'):
+                    self.grover_n(circuit, key, value, [value[0]], extra, ancilla)
             # self.prepare(f, circuit, key, value, ancilla, extra)
 
-        unprepare_once()
+        with stage(circuit, 'unprepare_once'):
+            unprepare_once()
 
         return circuit
 
@@ -110,7 +128,7 @@ class QValueSearchDictionary():
         # oracle
         # controlled_X(qc, q, e, a)
         controlled(qc, q, e, a, c_gate = lambda qc, ctrl, tgt: czxzx(qc, ctrl, tgt))
-        self.unprepare(f, qc, key, value, a, e)
+        self.unprepare(self.f, qc, key, value, a, e, self.qft_degree)
 
         # diffusion
         for i in range(0, len(all)):
@@ -127,69 +145,49 @@ class QValueSearchDictionary():
         # qc.h(a[0])
         # qc.x(a[0])
 
-        self.prepare(f, qc, key, value, a, e)
-
-    def __process(self, n_bits, c_bits, probs, neg=False):
-        kvs = {}
-        entries = {}
-        outcomes = {}
-        for b, c in probs.items():
-            key = int(b[0:n_bits], 2)
-            value = int(b[n_bits:n_bits + c_bits], 2)
-            kvs[key] = value
-            if neg is True and value >= 2**(c_bits-1):
-                value = value - 2**c_bits
-            entries[key] = '%d' % key + " = " + b[0:n_bits] + " -> " + b[n_bits:n_bits + c_bits] + " = " + '%d' % value
-            idx = '%d' % key + " -> " + '%d' % value
-            outcomes[idx] = outcomes.get(idx, 0) + c
-
-        # for v in sorted(entries.items(), key=lambda x: x[1]):
-        #     print(v[1])
-        return sorted(kvs.items(), key=lambda x: x[1]), outcomes
-
-    def __process_values(self, n_bits, c_bits, probs):
-        value_freq = {}
-        for b, c in probs.items():
-            value = int(b[n_bits:n_bits + c_bits], 2)
-            value_freq[value] = value_freq.get(value, 0) + c
-
-        factor=1.0/sum(value_freq.values())
-        value_freq = {k: v*factor for k, v in value_freq.items()}
+        self.prepare(self.f, qc, key, value, a, e, self.qft_degree)
 
-        return value_freq
+    def __result(self, circuit, neg = False):
+        indices, probs = get_distribution((circuit, None, None), 'sim', ('key', 'value'))
+        result = DictionaryResult(self.key_bits, self.value_bits, indices, probs, neg)
+        result.resources = self.resources = CircuitResources(circuit)
+        return result
 
-    def get_value_distribution(self):
-        circuit = self.__build_circuit(self.key_bits, self.value_bits, self.f, None, None)
-        probs = get_probs((circuit, None, None), 'sim', False)
+    def get_value_distribution(self, neg = False):
+        circuit = self.__build_circuit(self.key_bits, self.value_bits, self.f, None)
+        result = self.__result(circuit, neg)
 
-        ordered_probs = sorted(probs.items(), key=lambda x: x[1], reverse=True)
-        print("Probabilities: ", ordered_probs)
+        if self.verbose:
+            ordered_probs = sorted(result.bitstring_probabilities().items(), key=lambda x: x[1], reverse=True)
+            print("Probabilities: ", ordered_probs)
 
-        v_freq = self.__process_values(self.key_bits, self.value_bits, probs)
+            v_freq = result.value_frequencies()
 
-        from qiskit.tools import visualization
-        visualization.plot_histogram(v_freq)
+            from qiskit.tools import visualization
+            visualization.plot_histogram(v_freq)
 
-        ordered_freq = sorted(v_freq.items(), key=lambda x: x[1], reverse=True)
+            ordered_freq = sorted(v_freq.items(), key=lambda x: x[1], reverse=True)
+            print("Value Distribution", ordered_freq)
 
-        print("Value Distribution", ordered_freq)
+        return result
 
     def get_value_for_key(self, key, neg = False):
         circuit = self.__build_circuit(self.key_bits, self.value_bits, self.f, key)
-        probs = get_probs((circuit, None, None), 'sim', False)
+        result = self.__result(circuit, neg)
 
-        from qiskit.tools import visualization
-        visualization.plot_histogram(probs)
+        if self.verbose:
+            probs = result.bitstring_probabilities()
 
-        ordered_probs = sorted(probs.items(), key=lambda x: x[1], reverse=True)
-        print("Probabilities: ", ordered_probs)
+            from qiskit.tools import visualization
+            visualization.plot_histogram(probs)
 
-        _, outcomes = self.__process(self.key_bits, self.value_bits, probs, neg)
-        ordered_outcomes = sorted(outcomes.items(), key=lambda x: x[1], reverse=True)
+            ordered_probs = sorted(probs.items(), key=lambda x: x[1], reverse=True)
+            print("Probabilities: ", ordered_probs)
 
-        print("Outcomes", ordered_outcomes)
-        return ordered_probs[0][0]
+            ordered_outcomes = sorted(result.outcome_probabilities().items(), key=lambda x: x[1], reverse=True)
+            print("Outcomes", ordered_outcomes)
 
+        return result
 
 if __name__ == "__main__":
 
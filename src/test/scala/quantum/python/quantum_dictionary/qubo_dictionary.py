@@ -1,8 +1,9 @@
 import numpy as np
 import math
 
-from circuit_util import controlled_X, controlled_ry, cry, qft, iqft, oracle_first_bit_one
+from circuit_util import controlled_X, controlled_ry, function_rotations, qft, iqft, oracle_first_bit_one
 
+from bounds import polynomial_range
 from quantum_dictionary import QDictionary
 
 class QQUBODictionary(QDictionary):
@@ -20,49 +21,97 @@ class QQUBODictionary(QDictionary):
                     controlled_X(circuit, [value[i] for i in ctrl], extra, [value[tgt]])
 
     @staticmethod
-    def prepare(d, circuit, key, value, ancilla, extra):
-        for i in range(len(value)):
-            if d.get(-1, 0) != 0:
-                cry(1/2 ** len(value) * 2 * np.pi * 2 ** (i + 1) * d[-1], circuit, value[i], ancilla[0])
-            for j in range(len(key)):
-                if d.get(j, 0) != 0:
-                    controlled_ry(circuit, 1/2 ** len(value) * 2 * np.pi * 2 ** (i + 1) * d[j],
-                              [key[j], value[i]], extra, ancilla[0])  # sum on powers of 2
-
-        for i in range(len(value)):
-            for k, v in d.items():
-                if isinstance(k, tuple):
-                    controlled_ry(circuit, 1/2 ** len(value) * 2 * np.pi * 2 ** (i+1) * v, [key[k[0]], key[k[1]]] + [value[i]], extra, ancilla)
+    def terms(d):
+        # (sorted key positions, coefficient) of the nonzero terms in the order of d: -1 is the
+        # constant, j is key[j] and a tuple of any length the product of its key bits
+        terms = {}
+        for k, v in d.items():
+            term = () if k == -1 else tuple(sorted(set(int(j) for j in k))) if isinstance(k, tuple) else (int(k),)
+            terms[term] = terms.get(term, 0) + v
+        return [(term, v) for term, v in terms.items() if v != 0]
+
+    @staticmethod
+    def order_by_prefix(d):
+        # terms sorted so that the ones sharing leading key positions follow each other, which lets
+        # rotate_terms compute every shared AND once
+        return dict(sorted(d.items(), key=lambda item: QQUBODictionary.terms({item[0]: 1})[0][0]))
+
+    @staticmethod
+    def rotate_terms(d, circuit, key, value, ancilla, extra, sign = 1):
+        m = len(value)
+        if extra is None:
+            # native multi-controlled rotations need no ladders
+            for term, v in QQUBODictionary.terms(d):
+                for i in range(m):
+                    controlled_ry(circuit, sign/2 ** m * 2 * np.pi * 2 ** (i + 1) * v, [key[j] for j in term] + [value[i]], extra, ancilla)
+            return
+
+        # AND ladder over extra: with stack = [j0, j1, ..], extra[l - 1] holds key[j0] & .. & key[jl],
+        # consecutive terms keep the ANDs of their common leading positions
+        stack = []
+
+        def and_of(l):
+            return key[stack[0]] if l == 0 else extra[l - 1]
+
+        def push(j):
+            stack.append(j)
+            if len(stack) > 1:
+                circuit.ccx(and_of(len(stack) - 2), key[j], extra[len(stack) - 2])
+
+        def pop():
+            if len(stack) > 1:
+                circuit.ccx(and_of(len(stack) - 2), key[stack[-1]], extra[len(stack) - 2])
+            stack.pop()
+
+        for term, v in QQUBODictionary.terms(d):
+            shared = 0
+            while shared < min(len(stack), len(term)) and stack[shared] == term[shared]:
+                shared += 1
+            while len(stack) > shared:
+                pop()
+            for j in term[shared:]:
+                push(j)
+
+            # the rotations of every value bit, controlled by the term's AND, as singly
+            # controlled multiplexors (no further Toffolis)
+            if len(term) == 0:
+                function_rotations(circuit, [sign * v], [], [value[i] for i in range(m)], ancilla[0])
+            else:
+                function_rotations(circuit, [0, sign * v], [and_of(len(term) - 1)], [value[i] for i in range(m)], ancilla[0])
+
+        while stack:
+            pop()
+
+    @staticmethod
+    def prepare(d, circuit, key, value, ancilla, extra, qft_degree = None):
+        QQUBODictionary.rotate_terms(d, circuit, key, value, ancilla, extra)
 
         # cry(1/2 ** len(value) * 2 * np.pi * 2 * -1, circuit, value[0], ancilla[0]) # flips 0 sign bit to 1
         # circuit.u1(1/2 ** len(value) * 2 * np.pi * 1, value[0])
         # controlled_X(circuit, [value[0]] + [ value[i] for i in range(len(value) - bit, len(value))], extra, value[len(value) - bit])
 
-        iqft(circuit, [value[i] for i in range(len(value))])
+        iqft(circuit, [value[i] for i in range(len(value))], qft_degree)
 
         # QQUBODictionary.shift_negatives_up(10, circuit, extra, value)
 
     @staticmethod
-    def unprepare(d, circuit, key, value, ancilla, extra):
-        qft(circuit, [value[i] for i in range(len(value))])
+    def unprepare(d, circuit, key, value, ancilla, extra, qft_degree = None):
+        qft(circuit, [value[i] for i in range(len(value))], qft_degree)
 
-        for i in range(len(value)):
-            if d.get(-1, 0) != 0:
-                cry(-1/2 ** len(value) * 2 * np.pi * 2 ** (i + 1) * d[-1], circuit, value[i], ancilla[0])
-            for j in range(len(key)):
-                if d.get(j, 0) != 0:
-                    controlled_ry(circuit, -1/2 ** len(value) * 2 * np.pi * 2 ** (i + 1) * d[j],
-                              [key[j], value[i]], extra, ancilla[0])  # sum on powers of 2
+        QQUBODictionary.rotate_terms(d, circuit, key, value, ancilla, extra, -1)
 
-        for i in range(len(value)):
-            for k, v in d.items():
-                if isinstance(k, tuple):
-                    controlled_ry(circuit, -1/2 ** len(value) * 2 * np.pi * 2 ** (i+1) * v, [key[k[0]], key[k[1]]] + [value[i]], extra, ancilla)
+    def __init__(self, key_bits, value_bits, precision_bits, d, qft_degree = None, order_terms = False):
+        # d: coefficients by term, see terms; order_terms reorders them by shared prefix
+        if order_terms:
+            d = QQUBODictionary.order_by_prefix(d)
+        QDictionary.__init__(self, key_bits, value_bits, precision_bits, d, QQUBODictionary.prepare, QQUBODictionary.unprepare, qft_degree)
 
-    def __init__(self, key_bits, value_bits, precision_bits, d):
-        QDictionary.__init__(self, key_bits, value_bits, precision_bits, d, QQUBODictionary.prepare, QQUBODictionary.unprepare)
+    @staticmethod
+    def value_bounds(key_bits, d):
+        return polynomial_range(QQUBODictionary.terms(d), key_bits)
 
     def get_count_for_value_less_than(self, v):
+        self.invalidate()
         self.f[-1] = -v
         return self.get_value_count(oracle_first_bit_one)
 
@@ -155,11 +204,9 @@ if __name__ == "__main__":
         # 6 = 110 -> 010000 = 16
         # 7 = 111 -> 111000 = -8
 
-        k = v[0:n_key]
-        v = int(v[n_key:n_key + n_value], 2)
-        if v >= 2**(n_value-1):
-            v = v - 2**n_value
-        print("QUBO value for " + k, " = ", v) # -23
+        top = v.most_likely()
+        k = format(top['key'], '0%db' % n_key)
+        print("QUBO value for " + k, " = ", top['signed_value']) # -23
 
         # qd.get_negative_value_count() # 4
         # sines =  [(4.0, 1.003512)]
@@ -0,0 +1,107 @@
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from statevector import circuit_ops, qubit_offsets
+
+
+# registers that hold the dictionary itself, everything else counts as ancilla
+DATA_REGISTERS = ('key', 'value', 'precision')
+
+
+def count_ops(ops, n_qubits):
+    # gate counts by name, two-qubit (or wider) gates, depth and the qubits touched
+    levels = [0] * n_qubits
+    counts = Counter()
+    two_qubit = 0
+    touched = set()
+    for name, _, qubits in ops:
+        if name == 'checkpoint':
+            continue
+        counts[name] += 1
+        if len(qubits) > 1:
+            two_qubit += 1
+        level = max(levels[q] for q in qubits) + 1
+        for q in qubits:
+            levels[q] = level
+        touched.update(qubits)
+
+    return {
+        'gates': sum(counts.values()),
+        'gate_counts': dict(counts),
+        'two_qubit_gates': two_qubit,
+        'depth': max(levels) if levels else 0,
+        'qubits_used': len(touched),
+        'touched': touched
+    }
+
+
+def circuit_resources(circuit):
+    n, ops = circuit_ops(circuit)
+    resources = count_ops(ops, n)
+    resources['qubits'] = n
+    return resources
+
+
+@contextmanager
+def stage(circuit, name):
+    # tags the instructions emitted inside the block as the named stage
+    if not hasattr(circuit, 'stages'):
+        circuit.stages = []
+    start = len(circuit.data)
+    yield
+    circuit.stages.append((name, start, len(circuit.data)))
+
+
+class CircuitResources():
+    # Gate counts, two-qubit gates, depth and ancilla usage of a circuit, per stage
+    #
+    # A stage that is emitted several times (prepare in the counting loop) is reported
+    # once, over all its instructions, with the number of repetitions.
+    # Computed on first access.
+
+    def __init__(self, circuit):
+        self.circuit = circuit
+        self.__stages = None
+        self.__total = None
+
+    def __ancillas(self, resources):
+        offsets, _ = qubit_offsets(self.circuit)
+        ancillas = set()
+        for name, register in self.circuit.get_qregs().items():
+            if name not in DATA_REGISTERS:
+                ancillas.update(range(offsets[name], offsets[name] + register.size))
+        touched = resources.pop('touched')
+        resources['ancillas_used'] = len(touched & ancillas)
+        return resources
+
+    @property
+    def stages(self):
+        if self.__stages is None:
+            spans = OrderedDict()
+            for name, start, end in getattr(self.circuit, 'stages', []):
+                spans.setdefault(name, []).append((start, end))
+
+            self.__stages = OrderedDict()
+            for name, ranges in spans.items():
+                n, ops = circuit_ops(self.circuit, [i for start, end in ranges for i in self.circuit.data[start:end]])
+                self.__stages[name] = self.__ancillas(count_ops(ops, n))
+                self.__stages[name]['repetitions'] = len(ranges)
+        return self.__stages
+
+    @property
+    def total(self):
+        if self.__total is None:
+            self.__total = self.__ancillas(circuit_resources(self.circuit))
+        return self.__total
+
+    def dominant(self, measure = 'gates'):
+        return max(self.stages.items(), key=lambda x: x[1][measure])[0] if self.stages else None
+
+    def as_dict(self):
+        return {'total': self.total, 'stages': dict(self.stages)}
+
+    def __str__(self):
+        lines = ["%-16s %5s %8s %8s %8s %8s" % ('stage', 'reps', 'gates', '2q', 'depth', 'ancilla')]
+        for name, r in list(self.stages.items()) + [('total', dict(self.total, repetitions=1))]:
+            lines.append("%-16s %5d %8d %8d %8d %8d" % (name, r['repetitions'], r['gates'], r['two_qubit_gates'], r['depth'], r['ancillas_used']))
+        return "\n".join(lines)
@@ -0,0 +1,110 @@
+import numpy as np
+
+
+OUTCOME = np.dtype([('key', np.int64), ('value', np.int64), ('signed_value', np.int64), ('probability', np.float64)])
+
+
+def reverse_bits(indices, width):
+    # the low width bits of indices, read with bit 0 as the most significant one
+    reversed_indices = np.zeros(len(indices), dtype=np.int64)
+    for j in range(width):
+        reversed_indices |= ((indices >> j) & 1) << (width - 1 - j)
+    return reversed_indices
+
+
+def to_signed(values, bits):
+    # two's complement
+    values = np.asarray(values, dtype=np.int64)
+    return values - (values >= 2**(bits - 1)) * 2**bits
+
+
+class DictionaryResult():
+    # Key/value outcomes of a dictionary query backed by a structured array
+    #
+    # indices are measurement outcomes with qubit 0 as bit 0 whose low key_bits + value_bits
+    # bits are the key and value registers; outcomes that only differ elsewhere are summed.
+    # The strings of the printed reports are only built when asked for.
+
+    def __init__(self, key_bits, value_bits, indices, probabilities, neg = False):
+        self.key_bits = key_bits
+        self.value_bits = value_bits
+        self.neg = neg
+
+        indices = np.asarray(indices, dtype=np.int64) & (2**(key_bits + value_bits) - 1)
+        unique, inverse = np.unique(indices, return_inverse=True)
+
+        self.outcomes = np.zeros(len(unique), dtype=OUTCOME)
+        self.outcomes['key'] = reverse_bits(unique, key_bits)
+        self.outcomes['value'] = reverse_bits(unique >> key_bits, value_bits)
+        self.outcomes['signed_value'] = to_signed(self.outcomes['value'], value_bits)
+        self.outcomes['probability'] = np.bincount(inverse, np.asarray(probabilities, dtype=np.float64), len(unique))
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    @property
+    def key(self):
+        return self.outcomes['key']
+
+    @property
+    def value(self):
+        return self.outcomes['value']
+
+    @property
+    def signed_value(self):
+        return self.outcomes['signed_value']
+
+    @property
+    def probability(self):
+        return self.outcomes['probability']
+
+    def values(self):
+        # signed or unsigned, as requested at query time
+        return self.signed_value if self.neg else self.value
+
+    def most_likely(self):
+        return self.outcomes[np.argmax(self.probability)]
+
+    def lookup(self, keys):
+        # the most likely outcome of every key, with its probability given that key
+        keys = np.asarray(keys, dtype=np.int64)
+        order = np.lexsort((-self.probability, self.key))
+        sorted_keys = self.key[order]
+        pos = np.minimum(np.searchsorted(sorted_keys, keys), len(order) - 1)
+        missing = sorted_keys[pos] != keys
+        if missing.any():
+            raise ValueError("keys without outcomes: " + str(keys[missing].tolist()))
+
+        rows = self.outcomes[order[pos]]
+        rows['probability'] /= np.bincount(self.key, self.probability, 2**self.key_bits)[keys]
+        return rows
+
+    def value_distribution(self):
+        # normalized probability of every unsigned value 0 .. 2^value_bits - 1
+        freq = np.bincount(self.value, self.probability, 2**self.value_bits)
+        return freq / freq.sum()
+
+    def value_frequencies(self):
+        freq = self.value_distribution()
+        values = to_signed(np.arange(len(freq)), self.value_bits) if self.neg else np.arange(len(freq))
+        return {int(v): f for v, f in zip(values, freq) if f > 0}
+
+    def bitstring(self, i):
+        o = self.outcomes[i]
+        return format(o['key'], '0%db' % self.key_bits) + format(o['value'], '0%db' % self.value_bits)
+
+    def bitstring_probabilities(self):
+        return {self.bitstring(i): p for i, p in enumerate(self.probability)}
+
+    def outcome_probabilities(self):
+        return {'%d -> %d' % (k, v): p for k, v, p in zip(self.key, self.values(), self.probability)}
+
+    def entries(self):
+        lines = []
+        for i in np.argsort(self.key, kind='stable'):
+            b = self.bitstring(i)
+            lines.append('%d' % self.key[i] + " = " + b[:self.key_bits] + " -> " + b[self.key_bits:] + " = " + '%d' % self.values()[i])
+        return lines
+
+    def __str__(self):
+        return "\n".join(self.entries())
@@ -0,0 +1,106 @@
+from collections import Counter
+
+import numpy as np
+
+
+def alias_table(probs):
+    # Vose's alias method: O(n) to build, then O(1) per sample
+    n = len(probs)
+    scaled = probs * n / probs.sum()
+    accept = np.ones(n)
+    alias = np.arange(n)
+    small = list(np.flatnonzero(scaled < 1))
+    large = list(np.flatnonzero(scaled >= 1))
+    while small and large:
+        s, l = small.pop(), large.pop()
+        accept[s] = scaled[s]
+        alias[s] = l
+        scaled[l] -= 1 - scaled[s]
+        (small if scaled[l] < 1 else large).append(l)
+    return accept, alias
+
+
+class ShotSampler():
+    # Draws measurement outcomes from a probability vector instead of re-running the circuit
+    #
+    # indices: the basis states the probabilities belong to (the support of a sparse state),
+    # all 2^n of them if omitted. method is 'cumsum' (binary search on the cumulative sum)
+    # or 'alias' (Vose's alias table, faster for very many shots).
+
+    def __init__(self, probs, indices = None, seed = None, method = 'cumsum'):
+        probs = np.asarray(probs, dtype=np.float64)
+        self.indices = indices
+        self.reseed(seed)
+        self.method = method
+        if method == 'alias':
+            self.accept, self.alias = alias_table(probs)
+        elif method == 'cumsum':
+            self.cdf = np.cumsum(probs)
+            self.cdf /= self.cdf[-1]
+        else:
+            raise ValueError("unknown sampling method: " + method)
+
+    def reseed(self, seed = None):
+        self.rng = np.random.RandomState(seed)
+
+    def sample(self, shots):
+        if self.method == 'alias':
+            column = self.rng.randint(0, len(self.accept), shots)
+            samples = np.where(self.rng.random_sample(shots) < self.accept[column], column, self.alias[column])
+        else:
+            samples = np.minimum(np.searchsorted(self.cdf, self.rng.random_sample(shots), side='right'), len(self.cdf) - 1)
+        return samples if self.indices is None else self.indices[samples]
+
+    def chunks(self, shots, chunk_size = 2**20):
+        # the samples of a large shot count, chunk_size at a time
+        for start in range(0, shots, chunk_size):
+            yield self.sample(min(chunk_size, shots - start))
+
+    def counts(self, shots, measures, n_clbits, chunk_size = 2**20):
+        # counts keyed like qiskit's, highest classical bit first; measures: (qubit, clbit) pairs.
+        # n_clbits is the width of a single classical register or the list of the widths of
+        # every register: qiskit keys then read the last register first, a space between registers
+        widths = [n_clbits] if isinstance(n_clbits, int) else list(n_clbits)
+        total = Counter()
+        for samples in self.chunks(shots, chunk_size):
+            outcomes = np.zeros(len(samples), dtype=np.int64)
+            for qubit, clbit in measures:
+                outcomes |= ((samples >> qubit) & 1) << clbit
+            values, counts = np.unique(outcomes, return_counts=True)
+            total.update(dict(zip(values.tolist(), counts.tolist())))
+        return {register_key(v, widths): c for v, c in sorted(total.items())}
+
+
+def register_key(v, widths):
+    # bits of v split into registers of the given widths, the first register last, as qiskit's
+    # qasm simulator formats counts
+    bits = format(v, '0%db' % sum(widths))
+    keys, end = [], len(bits)
+    for width in widths:
+        keys.insert(0, bits[end - width:end])
+        end -= width
+    return ' '.join(keys)
+
+
+def measurements(circuit):
+    # (qubit, clbit) of every measure in circuit, global indices in register order, and the
+    # widths of the classical registers
+    def offsets(registers):
+        result, n = {}, 0
+        for name, register in registers.items():
+            result[name] = n
+            n += register.size
+        return result, n
+
+    qoffsets, _ = offsets(circuit.get_qregs())
+    coffsets, _ = offsets(circuit.get_cregs())
+    measures = [(qoffsets[q.name] + i, coffsets[c.name] + j)
+                for (q, i), (c, j) in (instruction.arg for instruction in circuit.data if instruction.name == 'measure')]
+    return measures, [register.size for register in circuit.get_cregs().values()]
+
+
+def sample_counts(circuit, probs, shots, indices = None, seed = None, method = 'cumsum'):
+    measures, widths = measurements(circuit)
+    if not measures:
+        return {}
+    return ShotSampler(probs, indices, seed, method).counts(shots, measures, widths)
@@ -0,0 +1,153 @@
+import copy
+import hashlib
+import importlib
+import threading
+
+# importing QISKit
+from qiskit import compile, register, available_backends, get_backend, QuantumJob
+
+from circuit_cache import CircuitCache
+
+import fake_backend
+import sparse_state
+import statevector
+
+
+def strip_checkpoints(qc):
+    # checkpoints only mean something to the in-repo engines
+    if not any(instruction.name == 'checkpoint' for instruction in qc.data):
+        return qc
+    stripped = copy.copy(qc)
+    stripped.data = [instruction for instruction in qc.data if instruction.name != 'checkpoint']
+    return stripped
+
+
+def circuit_hash(qc):
+    return hashlib.sha1(qc.qasm().encode()).hexdigest()
+
+
+class BackendSession():
+    # Connection state shared by every run: accounts registered once, backend handles,
+    # backend configurations and compiled circuits cached, and the local engines by name
+    #
+    # A local engine is a function (qc, shots, cfg) -> result, optionally with a
+    # run_batch (circuits, shots, cfg) -> results that runs them as one job. Besides the built-in ones,
+    # a Qconfig profile can plug engines in with 'engines': {'name': 'module.function'}.
+    # Accounts are registered with qiskit's register, or with the registrar added for their url.
+    #
+    # Runs may come from several threads (async_jobs): the shared state is only touched under
+    # lock, reentrant as compile_many looks up the configuration, while jobs wait unlocked.
+
+    def __init__(self):
+        self.engines = {}
+        # engines that run a list of circuits as one job
+        self.batch_engines = {}
+        self.accounts = set()
+        self.handles = {}
+        self.configurations = {}
+        # compiled qobjs by (circuit, backend, coupling map)
+        self.compiled = CircuitCache(maxsize=64)
+        self.registrations = 0
+        # register functions by account url, qiskit's register for the others
+        self.registrars = {}
+        self.lock = threading.RLock()
+
+    def add_engine(self, name, run, run_batch = None):
+        with self.lock:
+            self.engines[name] = run
+            if run_batch is not None:
+                self.batch_engines[name] = run_batch
+
+    def add_registrar(self, url, register):
+        with self.lock:
+            self.registrars[url] = register
+
+    def plug_engines(self, cfg):
+        with self.lock:
+            for name, path in cfg.get('engines', {}).items():
+                if name not in self.engines:
+                    module, function = path.rsplit('.', 1)
+                    self.add_engine(name, getattr(importlib.import_module(module), function))
+
+    def connect(self, cfg):
+        if 'url' not in cfg.keys():
+            return
+        account = (cfg['url'], cfg['token'], cfg.get('hub'), cfg.get('group'), cfg.get('project'))
+        with self.lock:
+            if account in self.accounts:
+                return
+            self.registrars.get(cfg['url'], register)(cfg['token'], cfg['url'], cfg.get('hub'), cfg.get('group'), cfg.get('project'))
+            self.accounts.add(account)
+            self.registrations += 1
+            print(available_backends())
+
+    def backend(self, name):
+        with self.lock:
+            if name not in self.handles:
+                self.handles[name] = get_backend(name)
+            return self.handles[name]
+
+    def configuration(self, name):
+        with self.lock:
+            if name not in self.configurations:
+                self.configurations[name] = self.backend(name).configuration
+            return self.configurations[name]
+
+    def compile(self, qc, backend, seed = None):
+        return self.compile_many([qc], backend, seed)
+
+    def compile_many(self, circuits, backend, seed = None):
+        # the qobj carries the simulator seed: None draws fresh shots on every run
+        coupling_map = self.configuration(backend)['coupling_map']
+        # results are looked up by circuit name, so the name is part of the key
+        key = (tuple((qc.name, circuit_hash(qc)) for qc in circuits), backend, repr(coupling_map), seed)
+        with self.lock:
+            return self.compiled.get(key, lambda: compile(circuits, backend=backend, coupling_map=coupling_map, seed=seed))
+
+    def execute(self, qobj, backend, shots):
+        # what execute does after compiling
+        qobj = dict(qobj, config=dict(qobj['config'], shots=shots))
+        backend = self.backend(backend)
+        job = QuantumJob(qobj, backend=backend, preformatted=True, resources={'max_credits': qobj['config']['max_credits']})
+        return backend.run(job)
+
+    def run(self, shots, qc, cfg, backend = None):
+        if backend is None:
+            backend = cfg['backend']
+
+        self.plug_engines(cfg)
+        self.connect(cfg)
+        if backend in self.engines:
+            return self.engines[backend](qc, shots, cfg)
+
+        qc = strip_checkpoints(qc)
+
+        qobj = self.compile(qc, backend, cfg.get('seed'))
+        #print(qobj['circuits'][0]['compiled_circuit_qasm'])
+
+        job = self.execute(qobj, backend, shots)
+        return job.result()
+
+    def run_counts(self, shots, circuits, cfg, backend = None):
+        # counts of several measured circuits, submitted as one job where the backend allows it
+        if backend is None:
+            backend = cfg['backend']
+
+        self.plug_engines(cfg)
+        self.connect(cfg)
+        if backend in self.batch_engines:
+            return [result.get_counts() for result in self.batch_engines[backend](circuits, shots, cfg)]
+        if backend in self.engines:
+            return [self.engines[backend](qc, shots, cfg).get_counts() for qc in circuits]
+
+        circuits = [strip_checkpoints(qc) for qc in circuits]
+
+        result = self.execute(self.compile_many(circuits, backend, cfg.get('seed')), backend, shots).result()
+        return [result.get_counts(qc) for qc in circuits]
+
+
+session = BackendSession()
+session.add_engine(statevector.NAME, statevector.run_statevector)
+session.add_engine(sparse_state.NAME, sparse_state.run_sparse)
+session.add_engine(fake_backend.NAME, fake_backend.run_fake_remote, fake_backend.run_fake_remote_batch)
+session.add_registrar(fake_backend.URL, fake_backend.register_fake_remote)
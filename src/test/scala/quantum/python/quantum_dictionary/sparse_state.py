@@ -0,0 +1,174 @@
+import numpy as np
+
+from statevector import GateEngine, StatevectorEngine, StatevectorResult, circuit_ops
+
+
+NAME = 'local_sparse_statevector_simulator'
+
+
+class SparseStateEngine(GateEngine):
+    # A statevector simulator that stores only the nonzero amplitudes
+    #
+    # Sorted basis indices and their amplitudes live in parallel arrays. Permutation gates (x, cx, ccx) only
+    # rewrite indices and diagonal gates (z, cz, cu1) only scale amplitudes, so the Toffoli
+    # ladders of circuit_util.controlled never grow the support. Branching gates (h, rx, ry)
+    # send every index to itself and its partner and merge the duplicates. Once the support
+    # crosses density_threshold * 2^n the simulation continues on a dense StatevectorEngine.
+
+    def __init__(self, n_qubits, density_threshold=0.125, tolerance=1e-12):
+        self.n_qubits = n_qubits
+        self.density_threshold = density_threshold
+        self.tolerance = tolerance
+        self.indices = np.zeros(1, dtype=np.int64)
+        self.amplitudes = np.ones(1, dtype=np.complex128)
+        self.is_sorted = True
+        self.dense = None
+
+    def _selected(self, qubits):
+        mask = 0
+        for q in qubits:
+            mask |= 1 << q
+        return (self.indices & mask) == mask
+
+    def apply_x(self, target, controls=()):
+        selected = self._selected(controls)
+        self.indices[selected] ^= 1 << target
+        self.is_sorted = False
+
+    def _sort(self):
+        # permutation gates leave long sorted runs behind, which a stable sort merges cheaply
+        if not self.is_sorted:
+            order = np.argsort(self.indices, kind='stable')
+            self.indices, self.amplitudes = self.indices[order], self.amplitudes[order]
+            self.is_sorted = True
+
+    def apply_phase(self, phase, target, controls=()):
+        selected = self._selected(tuple(controls) + (target,))
+        self.amplitudes[selected] *= phase
+
+    def apply_matrix(self, u, target, controls=()):
+        self._sort()
+        selected = np.flatnonzero(self._selected(controls))
+        self._apply_pairwise(np.broadcast_to(u, (len(selected), 2, 2)), target, selected)
+
+    def apply_function_rotation(self, f, key, value, target):
+        self._sort()
+        k = sum(((self.indices >> q) & 1) << (len(key) - 1 - j) for j, q in enumerate(key))
+        v = sum(((self.indices >> q) & 1) << i for i, q in enumerate(value))
+        theta = 4 * np.pi / 2**len(value) * np.asarray(f, dtype=float)[k] * v
+        c, s = np.cos(theta / 2), np.sin(theta / 2)
+        self._apply_pairwise(np.stack([np.stack([c, -s], -1), np.stack([s, c], -1)], -2), target, np.arange(len(self.indices)))
+
+    def apply_qft(self, qubits, inverse = False):
+        # entries that agree outside the register form one dense 2^m vector each, transformed
+        # like StatevectorEngine.apply_qft; the support grows to at most groups * 2^m
+        m = len(qubits)
+        msb_first = [2**(m - 1 - j) for j in range(m)]
+        in_weights, out_weights = (msb_first[::-1], msb_first) if inverse else (msb_first, msb_first[::-1])
+
+        mask = sum(1 << q for q in qubits)
+        rest, group = np.unique(self.indices & ~mask, return_inverse=True)
+        x = sum(((self.indices >> q) & 1) * w for q, w in zip(qubits, in_weights))
+
+        blocks = np.zeros((len(rest), 2**m), dtype=np.complex128)
+        blocks[group, x] = self.amplitudes
+        blocks = np.fft.fft(blocks, axis=-1, norm='ortho') if inverse else np.fft.ifft(blocks, axis=-1, norm='ortho')
+
+        y = np.arange(2**m)
+        scattered = sum(((y // w) & 1) << q for q, w in zip(qubits, out_weights))
+        indices = (rest[:, None] | scattered[None, :]).reshape(-1)
+        amplitudes = blocks.reshape(-1)
+
+        keep = np.abs(amplitudes) > self.tolerance
+        self.indices, self.amplitudes = indices[keep], amplitudes[keep]
+        self.is_sorted = False
+        self._sort()
+
+    def _apply_pairwise(self, u, target, selected):
+        # applies u[j] to the target qubit of the selected entry j and its partner, the
+        # selected positions refer to the sorted arrays
+        rows = np.arange(len(selected))
+        idx = self.indices[selected]
+        amp = self.amplitudes[selected]
+        bit = (idx >> target) & 1
+
+        # indices are kept sorted, so partners are found by binary search
+        partners = idx ^ (1 << target)
+        pos = np.minimum(np.searchsorted(self.indices, partners), len(self.indices) - 1)
+        paired = self.indices[pos] == partners
+        partner_amp = np.where(paired, self.amplitudes[pos], 0)
+
+        # entries whose partner is present update like the dense engine, each from its own side
+        self.amplitudes[selected] = u[rows, bit, bit] * amp + u[rows, bit, 1 - bit] * partner_amp
+
+        # lonely entries spill into partners that are not in the support yet
+        lonely = ~paired
+        if lonely.any():
+            spilled = u[rows[lonely], 1 - bit[lonely], bit[lonely]] * amp[lonely]
+            self.indices = np.concatenate([self.indices, partners[lonely]])
+            self.amplitudes = np.concatenate([self.amplitudes, spilled])
+            self.is_sorted = False
+            self._sort()
+
+        keep = np.abs(self.amplitudes) > self.tolerance
+        if not keep.all():
+            self.indices, self.amplitudes = self.indices[keep], self.amplitudes[keep]
+
+    def run(self, ops):
+        for name, params, qubits in ops:
+            if self.dense is not None:
+                self.dense.apply(name, params, qubits)
+                continue
+
+            self.apply(name, params, qubits)
+            if len(self.indices) > self.density_threshold * 2**self.n_qubits:
+                self.dense = StatevectorEngine(self.n_qubits, self.statevector)
+        return self
+
+    @property
+    def statevector(self):
+        if self.dense is not None:
+            return self.dense.statevector
+        state = np.zeros(2**self.n_qubits, dtype=np.complex128)
+        state[self.indices] = self.amplitudes
+        return state
+
+    def support(self):
+        if self.dense is not None:
+            return self.dense.support()
+        self._sort()
+        return self.indices, self.amplitudes
+
+
+def simulate_sparse(circuit, density_threshold=0.125):
+    n, ops = circuit_ops(circuit)
+    return SparseStateEngine(n, density_threshold).run(ops)
+
+
+class SparseStatevectorResult(StatevectorResult):
+    # Keeps the engine so that callers can read the support without a dense 2^n vector
+
+    def __init__(self, engine, circuit=None, shots=1, seed=None):
+        self.engine = engine
+        self.circuit = circuit
+        self.shots = shots
+        self.seed = seed
+
+    def get_data(self, circuit=None):
+        return {'statevector': self.engine.statevector}
+
+    def get_sparse(self, circuit=None):
+        indices, amplitudes = self.engine.support()
+        return self.engine.n_qubits, indices, amplitudes
+
+    def get_counts(self, circuit=None):
+        from sampling import sample_counts
+        indices, amplitudes = self.engine.support()
+        return sample_counts(circuit or self.circuit, np.abs(amplitudes)**2, self.shots, indices, self.seed)
+
+
+def run_sparse(qc, shots=1, cfg=None):
+    # gate fusion is not applied here: permutation gates are what keeps the support small
+    density_threshold = 0.125 if cfg is None else cfg.get('density_threshold', 0.125)
+    seed = None if cfg is None else cfg.get('seed')
+    return SparseStatevectorResult(simulate_sparse(qc, density_threshold), qc, shots, seed)
@@ -0,0 +1,297 @@
+import numpy as np
+from collections import OrderedDict
+
+
+NAME = 'local_numpy_statevector_simulator'
+
+H = np.array([[1, 1], [1, -1]], dtype=np.complex128) / np.sqrt(2)
+
+
+def rx_matrix(theta):
+    c, s = np.cos(theta / 2), np.sin(theta / 2)
+    return np.array([[c, -1j * s], [-1j * s, c]], dtype=np.complex128)
+
+
+def ry_matrix(theta):
+    c, s = np.cos(theta / 2), np.sin(theta / 2)
+    return np.array([[c, -s], [s, c]], dtype=np.complex128)
+
+
+class GateEngine():
+    # Dispatches circuit ops to apply_matrix / apply_x / apply_phase of an engine
+
+    def apply(self, name, params, qubits):
+        if name == 'h':
+            self.apply_matrix(H, qubits[0])
+        elif name in ('x', 'cx', 'ccx', 'mcx'):
+            self.apply_x(qubits[-1], qubits[:-1])
+        elif name in ('z', 'cz', 'mcz'):
+            self.apply_phase(-1, qubits[-1], qubits[:-1])
+        elif name in ('u1', 'cu1'):
+            self.apply_phase(np.exp(1j * params[0]), qubits[-1], qubits[:-1])
+        elif name == 'rx':
+            self.apply_matrix(rx_matrix(params[0]), qubits[0])
+        elif name == 'ry':
+            self.apply_matrix(ry_matrix(params[0]), qubits[0])
+        elif name == 'mcry':
+            self.apply_matrix(ry_matrix(params[0]), qubits[-1], qubits[:-1])
+        elif name == 'checkpoint':
+            pass
+        elif name == 'unitary' and len(qubits) == 1:
+            self.apply_matrix(params, qubits[0])
+        elif name == 'unitary':
+            self.apply_two_qubit_matrix(params, qubits[0], qubits[1])
+        elif name == 'encode_function':
+            n = int(np.log2(len(params)))
+            self.apply_function_rotation(params, qubits[:n], qubits[n:-1], qubits[-1])
+        elif name in ('qft', 'iqft'):
+            self.apply_qft(qubits, name == 'iqft')
+        else:
+            raise ValueError("unsupported gate: " + name)
+
+    def run(self, ops):
+        for name, params, qubits in ops:
+            self.apply(name, params, qubits)
+        return self
+
+
+class StatevectorEngine(GateEngine):
+    # A dense statevector simulator
+    #
+    # The state is a complex128 tensor of shape (2,) * n_qubits in qiskit's little endian
+    # order: qubit q lives on axis n_qubits - 1 - q, so the flattened tensor is the qiskit
+    # statevector. Controls are applied by fixing their axes to 1, which gives a view on the
+    # controlled subspace, and every gate updates that view in place.
+
+    def __init__(self, n_qubits, state=None):
+        self.n_qubits = n_qubits
+        if state is None:
+            state = np.zeros(2**n_qubits, dtype=np.complex128)
+            state[0] = 1
+        self.psi = np.asarray(state, dtype=np.complex128).reshape((2,) * n_qubits)
+
+    @property
+    def statevector(self):
+        return self.psi.reshape(-1)
+
+    def _halves(self, target, controls=()):
+        idx = [slice(None)] * self.n_qubits
+        for c in controls:
+            idx[self.n_qubits - 1 - c] = 1
+        idx[self.n_qubits - 1 - target] = 0
+        # the trailing Ellipsis keeps fully indexed halves as 0-d views
+        a0 = self.psi[tuple(idx) + (Ellipsis,)]
+        idx[self.n_qubits - 1 - target] = 1
+        a1 = self.psi[tuple(idx) + (Ellipsis,)]
+        return a0, a1
+
+    def apply_matrix(self, u, target, controls=()):
+        a0, a1 = self._halves(target, controls)
+        t = a0.copy()
+        a0 *= u[0, 0]
+        a0 += u[0, 1] * a1
+        a1 *= u[1, 1]
+        a1 += u[1, 0] * t
+
+    def apply_two_qubit_matrix(self, u, q0, q1):
+        # basis index of u is 2 * bit(q0) + bit(q1): one contraction over the two axes, as a
+        # single (4, 4) x (4, 2^(n-2)) product with the two axes moved to the front
+        axes = [self.n_qubits - 1 - q0, self.n_qubits - 1 - q1]
+        front = np.moveaxis(self.psi, axes, [0, 1])
+        front[...] = (u @ front.reshape(4, -1)).reshape(front.shape)
+
+    def apply_x(self, target, controls=()):
+        a0, a1 = self._halves(target, controls)
+        t = a0.copy()
+        a0[...] = a1
+        a1[...] = t
+
+    def apply_phase(self, phase, target, controls=()):
+        _, a1 = self._halves(target, controls)
+        a1 *= phase
+
+    def _register_value(self, qubits, weights, removed):
+        # value of a register as an array that broadcasts against a view without the removed axes
+        axes = [q for q in reversed(range(self.n_qubits)) if q not in removed]
+        total = np.zeros((1,) * len(axes), dtype=np.int64)
+        for q, w in zip(qubits, weights):
+            shape = [1] * len(axes)
+            shape[axes.index(q)] = 2
+            total = total + np.array([0, w]).reshape(shape)
+        return total
+
+    def apply_function_rotation(self, f, key, value, target):
+        # key[0] is the most significant key bit and value[0] the least significant value bit
+        k = self._register_value(key, [2**(len(key) - 1 - j) for j in range(len(key))], (target,))
+        v = self._register_value(value, [2**i for i in range(len(value))], (target,))
+        theta = 4 * np.pi / 2**len(value) * np.asarray(f, dtype=float)[k] * v
+        c, s = np.cos(theta / 2), np.sin(theta / 2)
+
+        a0, a1 = self._halves(target)
+        t = a0.copy()
+        a0 *= c
+        a0 -= s * a1
+        a1 *= c
+        a1 += s * t
+
+    def apply_qft(self, qubits, inverse = False):
+        # circuit_util.qft maps |x> to sum_y e^(2 pi i x y / 2^m) |y> / sqrt(2^m) where x reads
+        # qubits[0] as its most significant bit and y as its least significant one, an inverse
+        # fft along the register's axes; iqft is its adjoint
+        m = len(qubits)
+        msb_first = [self.n_qubits - 1 - q for q in qubits]
+        source, destination = (msb_first[::-1], msb_first) if inverse else (msb_first, msb_first[::-1])
+        last = list(range(self.n_qubits - m, self.n_qubits))
+
+        a = np.moveaxis(self.psi, source, last)
+        a = a.reshape(a.shape[:-m] + (2**m,))
+        a = np.fft.fft(a, axis=-1, norm='ortho') if inverse else np.fft.ifft(a, axis=-1, norm='ortho')
+        np.moveaxis(self.psi, destination, last)[...] = a.reshape(a.shape[:-1] + (2,) * m)
+
+    def support(self):
+        # (indices, amplitudes) of the nonzero basis states
+        state = self.statevector
+        indices = np.flatnonzero(state)
+        return indices, state[indices]
+
+
+def qubit_offsets(circuit):
+    offsets = {}
+    n = 0
+    for name, register in circuit.get_qregs().items():
+        offsets[name] = n
+        n += register.size
+    return offsets, n
+
+
+def instruction_op(instruction, offsets):
+    # (name, params, global qubit indices), None for what the engines skip
+    if instruction.name in ('measure', 'barrier'):
+        return None
+    if instruction.name == 'checkpoint':
+        return ('checkpoint', (instruction.checkpoint_key,), ())
+    qubits = tuple(offsets[r.name] + i for r, i in instruction.arg)
+    return (instruction.name, tuple(float(p) for p in instruction.param), qubits)
+
+
+def circuit_ops(circuit, instructions = None):
+    # flattens a qiskit circuit, or some of its instructions, into ops
+    offsets, n = qubit_offsets(circuit)
+    ops = [instruction_op(instruction, offsets) for instruction in (circuit.data if instructions is None else instructions)]
+    return n, [op for op in ops if op is not None]
+
+
+class SnapshotStore():
+    # Statevectors reached at circuit checkpoints, at most maxsize of them (LRU)
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self.states = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.states
+
+    def __len__(self):
+        return len(self.states)
+
+    def fork(self, key):
+        self.hits += 1
+        self.states.move_to_end(key)
+        return self.states[key].copy()
+
+    def put(self, key, state):
+        self.misses += 1
+        if self.maxsize <= 0:
+            return
+        self.states[key] = state.copy()
+        while len(self.states) > self.maxsize:
+            self.states.popitem(last=False)
+
+    def memory(self):
+        return sum(state.nbytes for state in self.states.values())
+
+    def stats(self):
+        # retained snapshots, their bytes, and forks / puts so far
+        return {'retained': len(self), 'memory': self.memory(), 'hits': self.hits, 'misses': self.misses}
+
+    def clear(self):
+        self.states.clear()
+
+
+snapshots = SnapshotStore()
+
+
+def simulate(circuit, fuse = False, snapshots = None):
+    n, ops = circuit_ops(circuit)
+
+    # segments[i] is followed by the checkpoint keys[i]
+    segments = [[]]
+    keys = []
+    for op in ops:
+        if op[0] == 'checkpoint':
+            keys.append(op[1][0])
+            segments.append([])
+        else:
+            segments[-1].append(op)
+
+    # resume from the latest checkpoint that has a snapshot
+    engine = None
+    first = 0
+    if snapshots is not None:
+        for i in reversed(range(len(keys))):
+            if keys[i] in snapshots:
+                engine = StatevectorEngine(n, snapshots.fork(keys[i]))
+                first = i + 1
+                break
+    if engine is None:
+        engine = StatevectorEngine(n)
+
+    eliminated = 0
+    for i in range(first, len(segments)):
+        segment = segments[i]
+        if fuse:
+            from fusion import fuse as fuse_ops
+            segment, e = fuse_ops(segment)
+            eliminated += e
+        engine.run(segment)
+        if snapshots is not None and i < len(keys) and keys[i] not in snapshots:
+            snapshots.put(keys[i], engine.statevector)
+
+    engine.ops_eliminated = eliminated
+    return engine
+
+
+class StatevectorResult():
+    # Mimics the parts of a qiskit Result that the dictionaries read
+
+    # ops that gate fusion removed from the simulated circuit
+    ops_eliminated = 0
+
+    def __init__(self, statevector, circuit=None, shots=1, seed=None, ops_eliminated=0):
+        self.statevector = statevector
+        self.circuit = circuit
+        self.shots = shots
+        self.seed = seed
+        self.ops_eliminated = ops_eliminated
+
+    def get_data(self, circuit=None):
+        return {'statevector': self.statevector}
+
+    def get_counts(self, circuit=None):
+        # sampled from the final state, as a qasm simulator would measure it
+        from sampling import sample_counts
+        return sample_counts(circuit or self.circuit, np.abs(self.statevector)**2, self.shots, seed=self.seed)
+
+
+def run_statevector(qc, shots=1, cfg=None):
+    fuse = cfg is not None and cfg.get('fuse_gates', False)
+    store = snapshots if cfg is not None and cfg.get('snapshots', False) else None
+    engine = simulate(qc, fuse, store)
+    if fuse and cfg.get('verbose', False):
+        print("Gate fusion eliminated", engine.ops_eliminated, "ops")
+    if store is not None and cfg.get('verbose', False):
+        print("Snapshots retained:", len(store), "(%.1f MB)" % (store.memory() / 2**20))
+    return StatevectorResult(engine.statevector, qc, shots, None if cfg is None else cfg.get('seed'),
+                             engine.ops_eliminated)
@@ -3,6 +3,7 @@ import math
 
 from circuit_util import controlled_ry, iqft
 
+from bounds import subset_sum_range
 from quantum_dictionary import QDictionary
 
 
@@ -10,24 +11,28 @@ class QSumDictionary(QDictionary):
     # A Quantum Dictionary built from a function
 
     @staticmethod
-    def prepare(f, circuit, key, value, ancilla, extra):
+    def prepare(f, circuit, key, value, ancilla, extra, qft_degree = None):
         # controlled rotations only n powers of 2
         for i in range(len(value)):
             for j in range(len(key)):
                 controlled_ry(circuit, 1/2 ** len(value) * 2 * np.pi * 2 ** (i + 1) * f[j],
                               [key[j], value[i]], extra, ancilla[0])  # sum on powers of 2
 
-        iqft(circuit, [value[i] for i in range(len(value))])
+        iqft(circuit, [value[i] for i in range(len(value))], qft_degree)
 
-    def __init__(self, key_bits, value_bits, f):
-        QDictionary.__init__(self, key_bits, value_bits, 0, f, QSumDictionary.prepare)
+    def __init__(self, key_bits, value_bits, f, qft_degree = None):
+        QDictionary.__init__(self, key_bits, value_bits, 0, f, QSumDictionary.prepare, qft_degree=qft_degree)
+
+    @staticmethod
+    def value_bounds(key_bits, f):
+        return subset_sum_range([f[j] for j in range(key_bits)])
 
     def get_sum(self):
         self.get_value_for_key(2 ** self.key_bits - 1)
 
     def is_sum_negative(self):
         sum = self.get_value_for_key(2 ** self.key_bits - 1, True)
-        return True if sum[self.key_bits] == '1' else False
+        return bool(sum.most_likely()['signed_value'] < 0)
 
 
 if __name__ == "__main__":
@@ -35,9 +40,8 @@ if __name__ == "__main__":
         f = [12, 3, -1]
 
         n_key = len(f)
-        n_value = math.ceil(np.log2(sum(f)))
 
-        qd = QSumDictionary(n_key, n_value, f)
+        qd = QSumDictionary(n_key, None, f) # 5 value bits for sums in [-1, 15]
         qd.get_sum()
 
     def test_compare():
@@ -56,9 +60,8 @@ if __name__ == "__main__":
         # f = [i for i in range(5)] #?
 
         n_key = len(f)
-        n_value = math.ceil(np.log2(sum(f)))
 
-        qd = QSumDictionary(n_key, n_value, f)
+        qd = QSumDictionary(n_key, None, f)
         qd.get_value_distribution()
 
     # test_sum()
@@ -1,80 +1,158 @@
+import hashlib
 import numpy as np
 
-# importing QISKit
-from qiskit import compile, execute, register, available_backends, get_backend
 from Qconfig import cfg as Qcfg
 
-def run(shots, qc, cfg, backend = None):
-    if 'url' in cfg.keys():
-        register(cfg['token'], cfg['url'], cfg['hub'], cfg['group'], cfg['project'])
-        print(available_backends())
-
-    if backend is None:
-        backend = cfg['backend']
-
-    backend_config = get_backend(backend).configuration
-    backend_coupling = backend_config['coupling_map']
+from circuit_cache import CircuitCache
+from sampling import ShotSampler, measurements
+from session import session
 
-    qc_compiled = compile([qc], backend=backend, coupling_map=backend_coupling, seed=0)
-    qc_compiled_qasm = qc_compiled['circuits'][0]['compiled_circuit_qasm']
-    #print(qc_compiled_qasm)
+import statevector
 
-    job = execute([qc], backend=backend, shots=shots)
-    result = job.result()
 
-    return result
+def run(shots, qc, cfg, backend = None):
+    return session.run(shots, qc, cfg, backend)
 
 
-def get_counts(c, cfg, backend = None):
+def get_counts(c, cfg, backend = None, shots = 1024, seed = None):
+    # with 'sample_counts' in the profile, shots are drawn from the simulated state instead of a qasm run
     qc, qr, cr = c
     qc.measure(qr, cr)
-    result = run(1024, qc, Qcfg[cfg], backend)
+    if backend is None and Qcfg[cfg].get('sample_counts', False):
+        measures, widths = measurements(qc)
+        sampler = get_sampler(qc, cfg)
+        sampler.reseed(seed)
+        return sampler.counts(shots, measures, widths)
+
+    result = run(shots, qc, Qcfg[cfg], backend)
     counts = result.get_counts()
     # visualization.plot_circuit(qc)
     return counts
 
 
-def histogram(state, prnt = True):
-    n = len(state)
-    pow = int(np.log2(n))
-    keys = [bin(i)[2::].rjust(pow, '0')[::-1] for i in range(0, n)]
-    #keys = [bin(i)[2::].rjust(pow, '0') for i in range(0, n)]
+# samplers of simulated states by (circuit without measurements, engine)
+samplers = CircuitCache(maxsize=16)
 
-    if prnt:
-        print("Quantum state:", dict(zip(keys, state)))
 
-    filtered_state = dict(filter(lambda p: abs(p[1])*abs(p[1]) > 0, dict(zip(keys, state)).items()))
-    from pprint import pprint
-    if prnt:
-        pprint(filtered_state)
+def get_sampler(qc, cfg, method = 'cumsum'):
+    # one simulation per circuit, then any number of shots for any shot count
+    backend = statevector_backend(cfg)
+
+    def simulate():
+        result = run(1, qc, Qcfg[cfg], backend)
+        if hasattr(result, 'get_sparse'):
+            _, indices, amplitudes = result.get_sparse(qc)
+            return ShotSampler(np.abs(amplitudes)**2, indices, method=method)
+        return ShotSampler(np.abs(result.get_data(qc)['statevector'])**2, method=method)
+
+    _, ops = statevector.circuit_ops(qc)
+    key = (hashlib.sha1(repr(ops).encode()).hexdigest(), backend, method)
+    return samplers.get(key, simulate)
+
+
+def bitstrings(indices, width):
+    # qubit 0 first, like the keys of histogram
+    bits = ((np.asarray(indices, dtype=np.int64)[:, None] >> np.arange(width)) & 1).astype(np.uint8) + ord('0')
+    return [b.decode() for b in np.ascontiguousarray(bits).view('S%d' % width).ravel()] if width > 0 else [''] * len(indices)
+
+
+def marginal(probs, n_qubits, qubits):
+    # sums a probability vector over all qubits not in qubits
+    drop = tuple(n_qubits - 1 - q for q in range(n_qubits) if q not in qubits)
+    return probs.reshape((2,) * n_qubits).sum(axis=drop).reshape(-1)
+
+
+def sparse_marginal(indices, probs, qubits):
+    reduced = np.zeros(len(indices), dtype=np.int64)
+    for j, q in enumerate(sorted(qubits)):
+        reduced |= ((indices >> q) & 1) << j
+    unique, inverse = np.unique(reduced, return_inverse=True)
+    return unique, np.bincount(inverse, probs, len(unique))
+
+
+def register_qubits(qc, names):
+    # global qubits of the named registers, in circuit order
+    offsets, _ = statevector.qubit_offsets(qc)
+    qregs = qc.get_qregs()
+    return sorted(offsets[name] + i for name in names for i in range(qregs[name].size))
+
+
+def rounded(a, decimals):
+    return a if decimals is None else np.round(a, decimals)
+
+
+def distribution(state, qubits = None, decimals = 5):
+    # indices and probabilities of the nonzero outcomes, marginalized onto qubits if given
+    probs = np.abs(state)**2
+    if qubits is not None:
+        probs = marginal(probs, int(np.log2(len(probs))), qubits)
+    probs = rounded(probs, decimals)
+    indices = np.flatnonzero(probs)
+    return indices, probs[indices]
+
+
+def histogram(state, prnt = True, qubits = None):
+    indices, probs = distribution(state, qubits)
+    keys = bitstrings(indices, int(np.log2(len(state))) if qubits is None else len(qubits))
+
+    if prnt and qubits is None:
+        from pprint import pprint
+        pprint(dict(zip(keys, state[indices])))
 
-    probs = [np.round(abs(a)*abs(a), 5) for a in state]
     hist = dict(zip(keys, probs))
     if prnt:
         print("hist", hist)
     # plot_state(hist)
-    filtered_hist = dict(filter(lambda p: p[1] > 0, hist.items()))
-    return filtered_hist
+    return hist
+
+
+def statevector_backend(cfg):
+    return Qcfg[cfg].get('statevector_backend', 'local_statevector_simulator')
+
+
+def get_distribution(c, cfg, registers = None, decimals = 5):
+    # indices and probabilities of the nonzero outcomes, without building bitstrings
+    # registers: names of the registers to keep, the others are summed out
+    # decimals: rounding of amplitudes and probabilities, None keeps outcomes below 1e-5
+    qc, _, _ = c
+    qubits = None if registers is None else register_qubits(qc, registers)
+    result = run(1, qc, Qcfg[cfg], statevector_backend(cfg))
+    if not hasattr(result, 'get_sparse'):
+        return distribution(rounded(result.get_data(qc)['statevector'], decimals), qubits, decimals)
+
+    _, indices, amplitudes = result.get_sparse(qc)
+    probs = np.abs(rounded(amplitudes, decimals))**2
+    if qubits is not None:
+        indices, probs = sparse_marginal(indices, probs, qubits)
+    probs = rounded(probs, decimals)
+    nonzero = np.flatnonzero(probs)
+    return indices[nonzero], probs[nonzero]
 
 
-def get_probs(c, cfg, prnt = True):
+def get_probs(c, cfg, prnt = True, registers = None):
     qc, _, _ = c
     # visualization.plot_circuit(qc)
-    result = run(1, qc, Qcfg[cfg], 'local_statevector_simulator')
-    state = np.round(result.get_data(qc)['statevector'], 5)
-    return histogram(state, prnt)
+    indices, probs = get_distribution(c, cfg, registers)
+    width = statevector.qubit_offsets(qc)[1] if registers is None else len(register_qubits(qc, registers))
+    hist = dict(zip(bitstrings(indices, width), probs))
+    if prnt:
+        print("hist", hist)
+    return hist
+
+
+def get_statevector(c, cfg):
+    qc, _, _ = c
+    result = run(1, qc, Qcfg[cfg], statevector_backend(cfg))
+    return np.asarray(result.get_data(qc)['statevector'])
 
 
 def get_state_and_probs(c, cfg):
     qc, _, _ = c
     # visualization.plot_circuit(qc)
-    result = run(1, qc, Qcfg[cfg], 'local_statevector_simulator')
+    result = run(1, qc, Qcfg[cfg], statevector_backend(cfg))
     state = np.round(result.get_data(qc)['statevector'], 5)
 
-    n = len(state)
-    pow = int(np.log2(n))
-    keys = [bin(i)[2::].rjust(pow, '0')[::-1] for i in range(0, n)]
-    #keys = [bin(i)[2::].rjust(pow, '0') for i in range(0, n)]
+    keys = bitstrings(np.arange(len(state)), int(np.log2(len(state))))
 
     return dict(zip(keys, state)), histogram(state)
 
@@ -1,6 +1,8 @@
 import numpy as np
 from qiskit import QuantumRegister, QuantumCircuit
 
+from quantum_dictionary.circuit_util import function_rotations
+
 
 def build_circuit(n_qbits, c_qbits, f, prepare, unprepare, oracle, iterations):
     key = QuantumRegister(n_qbits)
@@ -57,46 +59,23 @@ def iterate(circuit, key, value, search, e, a, prepare, unprepare, oracle):
     # prepare(f, circuit, key, value, a, e)
 
 
-def process(n_bits, c_bits, probs, neg=False):
-    kvs = {}
-    entries = {}
-    outcomes = {}
-    for b, c in probs.items():
-        key = int(b[0:n_bits], 2)
-        value = int(b[n_bits:n_bits + c_bits], 2)
-        kvs[key] = value
-        if neg is True and value >= 2 ** (c_bits - 1):
-            value = value - 2 ** c_bits
-        entries[key] = '%d' % key + " = " + b[0:n_bits] + " -> " + b[n_bits:n_bits + c_bits] + " = " + '%d' % value
-        idx = '%d' % key + " -> " + '%d' % value
-        outcomes[idx] = outcomes.get(idx, 0) + c
-
-    # for v in sorted(entries.items(), key=lambda x: x[1]):
-    #     print(v[1])
-    return sorted(kvs.items(), key=lambda x: x[1]), outcomes
-
-
-def process_values(n_bits, c_bits, probs, neg=False):
-    value_freq = {}
-    for b, c in probs.items():
-        value = int(b[n_bits:n_bits + c_bits], 2)
-        if neg is True and value >= 2 ** (c_bits - 1):
-            value = value - 2 ** c_bits
-        value_freq[value] = value_freq.get(value, 0) + c
+def get_result(circuit, key_bits, value_bits, neg=False):
+    # key and value are the first registers of the circuit, so the low bits of every outcome
+    from quantum_dictionary.result import DictionaryResult
+    from quantum_dictionary.statevector import simulate
 
-    factor = 1.0 / sum(value_freq.values())
-    value_freq = {k: v * factor for k, v in value_freq.items()}
-
-    return value_freq
+    probs = np.round(np.abs(np.round(simulate(circuit).statevector, 5))**2, 5)
+    indices = np.flatnonzero(probs)
+    return DictionaryResult(key_bits, value_bits, indices, probs[indices], neg)
 
 
 def get_value_distribution(circuit, key_bits, value_bits, neg=False):
-    probs = get_probs(circuit, False)
+    result = get_result(circuit, key_bits, value_bits, neg)
 
-    ordered_probs = sorted(probs.items(), key=lambda x: x[1], reverse=True)
+    ordered_probs = sorted(result.bitstring_probabilities().items(), key=lambda x: x[1], reverse=True)
     print("Probabilities: ", ordered_probs)
 
-    v_freq = process_values(key_bits, value_bits, probs, neg)
+    v_freq = result.value_frequencies()
 
     from qiskit.tools import visualization
     visualization.plot_histogram(v_freq)
@@ -104,10 +83,12 @@ def get_value_distribution(circuit, key_bits, value_bits, neg=False):
     ordered_freq = sorted(v_freq.items(), key=lambda x: x[1], reverse=True)
 
     print("Value Distribution", ordered_freq)
+    return result
 
 
 def get_value_for_key(circuit, key_bits, value_bits, neg=False):
-    probs = get_probs(circuit, False)
+    result = get_result(circuit, key_bits, value_bits, neg)
+    probs = result.bitstring_probabilities()
 
     from qiskit.tools import visualization
     visualization.plot_histogram(probs)
@@ -115,11 +96,10 @@ def get_value_for_key(circuit, key_bits, value_bits, neg=False):
     ordered_probs = sorted(probs.items(), key=lambda x: x[1], reverse=True)
     print("Probabilities: ", ordered_probs)
 
-    _, outcomes = process(key_bits, value_bits, probs, neg)
-    ordered_outcomes = sorted(outcomes.items(), key=lambda x: x[1], reverse=True)
+    ordered_outcomes = sorted(result.outcome_probabilities().items(), key=lambda x: x[1], reverse=True)
 
     print("Outcomes", ordered_outcomes)
-    return ordered_probs[0][0]
+    return result
 
 # ######## circuit utilities
 
@@ -223,21 +203,16 @@ def histogram(state, prnt=True):
 
 
 def get_probs(qc, prnt = True):
-    from qiskit import execute
+    from quantum_dictionary.statevector import simulate
 
-    job = execute([qc], backend='local_statevector_simulator', shots=1)
-    result = job.result()
-    state = np.round(result.get_data(qc)['statevector'], 5)
+    state = np.round(simulate(qc).statevector, 5)
     return histogram(state, prnt)
 
 
 if __name__ == "__main__":
 
     def prepare_function(f, circuit, key, value, ancilla, extra):
-        for i in range(len(value)):
-            for k in range(2 ** len(key)):
-                on_match_ry(len(key), k, circuit, 1 / 2 ** len(value) * 2 * np.pi * 2 ** (i + 1) * f[k],
-                            [key[j] for j in range(0, len(key))] + [value[i]], extra, ancilla)
+        function_rotations(circuit, f, [key[j] for j in range(len(key))], [value[i] for i in range(len(value))], ancilla[0])
 
         iqft(circuit, [value[i] for i in range(len(value))])
 
@@ -245,10 +220,8 @@ if __name__ == "__main__":
     def unprepare_function(f, circuit, key, value, ancilla, extra):
         qft(circuit, [value[i] for i in range(len(value))])
 
-        for i in range(len(value)):
-            for k in range(2 ** len(key)):
-                on_match_ry(len(key), k, circuit, -1 / 2 ** len(value) * 2 * np.pi * 2 ** (i + 1) * f[k],
-                            [key[j] for j in range(0, len(key))] + [value[i]], extra, ancilla)
+        function_rotations(circuit, [-f[k] for k in range(2 ** len(key))], [key[j] for j in range(len(key))],
+                           [value[i] for i in range(len(value))], ancilla[0])
 
 
     def prepare_quadratic(d, circuit, key, value, ancilla, extra):